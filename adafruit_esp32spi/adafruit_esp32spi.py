@@ -100,6 +100,87 @@ _ERR_CMD = const(0xEF)
 _REPLY_FLAG = const(1 << 7)
 _CMD_FLAG = const(0)
 
+# The command table, the one place that says how each command is framed and how its
+# reply looks (tools/esp32spi_simulator.py reads it too). Every entry is
+# (params, reply_params, reply_len, flags):
+#   params        the parameters, when they never change (the frame is then built once
+#                 and reused), otherwise None
+#   reply_params  number of reply parameters, None when it varies
+#   reply_len     total length of the reply parameters when it is known, else None
+#   flags         _CMD_SENT_LEN_16 / _CMD_RECV_LEN_16 when sent / reply parameters have
+#                 16 bit lengths, _CMD_SOCKET when the socket number is the only
+#                 parameter (the prebuilt frame is patched with it), _CMD_POLL or
+#                 _CMD_CONNECT for the "poll" and "connect" deadlines
+_CMD_SENT_LEN_16 = const(1)
+_CMD_RECV_LEN_16 = const(2)
+_CMD_SOCKET = const(4)
+_CMD_POLL = const(8)
+_CMD_CONNECT = const(16)
+_NO_PARAMS = ()
+_FF_PARAM = (b"\xff",)
+_SOCKET_PARAM = ((0,),)
+_SOCKET_FRAME_OFFSET = const(4)  # start, command, count and length come first
+
+_COMMANDS = {
+    _SET_NET_CMD: (None, 1, 1, _CMD_CONNECT),
+    _SET_PASSPHRASE_CMD: (None, 1, 1, _CMD_CONNECT),
+    _SET_IP_CONFIG: (None, 1, 1, 0),
+    _SET_DNS_CONFIG: (None, 1, 1, 0),
+    _SET_HOSTNAME: (None, 1, 1, 0),
+    _SET_AP_NET_CMD: (None, 1, 1, _CMD_CONNECT),
+    _SET_AP_PASSPHRASE_CMD: (None, 1, 1, _CMD_CONNECT),
+    _SET_DEBUG_CMD: (None, 1, 1, 0),
+    _GET_CONN_STATUS_CMD: (_NO_PARAMS, 1, 1, _CMD_POLL),
+    _GET_IPADDR_CMD: (_FF_PARAM, 3, 12, 0),
+    _GET_MACADDR_CMD: (_FF_PARAM, 1, 6, 0),
+    _GET_CURR_SSID_CMD: (_FF_PARAM, 1, None, 0),
+    _GET_CURR_BSSID_CMD: (_FF_PARAM, 1, 6, 0),
+    _GET_CURR_RSSI_CMD: (_FF_PARAM, 1, 4, 0),
+    _GET_CURR_ENCT_CMD: (_FF_PARAM, 1, 1, 0),
+    _SCAN_NETWORKS: (_NO_PARAMS, None, None, _CMD_CONNECT),
+    _START_SERVER_TCP_CMD: (None, 1, 1, _CMD_CONNECT),
+    _GET_SOCKET_CMD: (_NO_PARAMS, 1, 1, 0),
+    _GET_STATE_TCP_CMD: (_SOCKET_PARAM, 1, 1, _CMD_SOCKET | _CMD_POLL),
+    _DATA_SENT_TCP_CMD: (_SOCKET_PARAM, 1, 1, _CMD_SOCKET | _CMD_POLL),
+    _AVAIL_DATA_TCP_CMD: (_SOCKET_PARAM, 1, 2, _CMD_SOCKET | _CMD_POLL),
+    _GET_DATA_TCP_CMD: (None, 1, 1, 0),
+    _START_CLIENT_TCP_CMD: (None, 1, 1, _CMD_CONNECT),
+    _STOP_CLIENT_TCP_CMD: (_SOCKET_PARAM, 1, 1, _CMD_SOCKET),
+    _GET_CLIENT_STATE_TCP_CMD: (_SOCKET_PARAM, 1, 1, _CMD_SOCKET | _CMD_POLL),
+    _DISCONNECT_CMD: (_NO_PARAMS, 1, 1, _CMD_CONNECT),
+    _GET_IDX_RSSI_CMD: (None, 1, 4, 0),
+    _GET_IDX_ENCT_CMD: (None, 1, 1, 0),
+    _REQ_HOST_BY_NAME_CMD: (None, 1, 1, _CMD_CONNECT),
+    _GET_HOST_BY_NAME_CMD: (_NO_PARAMS, 1, 4, _CMD_CONNECT),
+    _START_SCAN_NETWORKS: (_NO_PARAMS, 1, 1, _CMD_CONNECT),
+    _GET_FW_VERSION_CMD: (_NO_PARAMS, 1, None, 0),
+    _SEND_UDP_DATA_CMD: (_SOCKET_PARAM, 1, 1, _CMD_SOCKET),
+    _GET_REMOTE_DATA_CMD: (_SOCKET_PARAM, 2, 6, _CMD_SOCKET),
+    _GET_TIME: (_NO_PARAMS, 1, 4, 0),
+    _GET_IDX_BSSID_CMD: (None, 1, 6, 0),
+    _GET_IDX_CHAN_CMD: (None, 1, 1, 0),
+    _PING_CMD: (None, 1, 2, _CMD_CONNECT),
+    _SEND_DATA_TCP_CMD: (None, 1, 2, _CMD_SENT_LEN_16),
+    _GET_DATABUF_TCP_CMD: (None, 1, None, _CMD_SENT_LEN_16 | _CMD_RECV_LEN_16),
+    _INSERT_DATABUF_TCP_CMD: (None, 1, 1, _CMD_SENT_LEN_16),
+    _SET_ENT_IDENT_CMD: (None, 1, 1, 0),
+    _SET_ENT_UNAME_CMD: (None, 1, 1, 0),
+    _SET_ENT_PASSWD_CMD: (None, 1, 1, 0),
+    _SET_ENT_ENABLE_CMD: (_NO_PARAMS, 1, 1, _CMD_CONNECT),
+    _SET_CLI_CERT: (None, 1, 1, 0),
+    _SET_PK: (None, 1, 1, 0),
+    _SET_PIN_MODE_CMD: (None, 1, 1, 0),
+    _SET_DIGITAL_WRITE_CMD: (None, 1, 1, 0),
+    _SET_ANALOG_WRITE_CMD: (None, 1, 1, 0),
+    _SET_DIGITAL_READ_CMD: (None, 1, 1, 0),
+    _SET_ANALOG_READ_CMD: (None, 1, 4, 0),
+}
+# firmware version that first supports each command added after the original set
+_COMMAND_VERSIONS = {
+    _SET_DIGITAL_READ_CMD: (1, 5, 0),
+    _SET_ANALOG_READ_CMD: (1, 5, 0),
+}
+
 SOCKET_CLOSED = const(0)
 SOCKET_LISTEN = const(1)
 SOCKET_SYN_SENT = const(2)
@@ -131,6 +212,111 @@ ADC_ATTEN_DB_2_5 = const(1)
 ADC_ATTEN_DB_6 = const(2)
 ADC_ATTEN_DB_11 = const(3)
 
+# the firmware's SPI buffer, no command frame can be any longer
+_MAX_FRAME_LEN = const(4092)
+# socket_write chunking: the original 64 byte size is accepted by every firmware, the
+# largest leaves room in the SPI buffer for the rest of the frame (9 bytes)
+_MIN_WRITE_CHUNK_SIZE = const(64)
+_MAX_WRITE_CHUNK_SIZE = const(4083)
+# response arena for fixed-shape replies, big enough for any of them
+_ARENA_SIZE = const(64)
+_ARENA_PARAMS = const(8)
+# default deadlines in seconds: waiting for ready on "poll" commands (status and socket
+# polls), "connect" ones (joining networks, opening sockets, DNS, scans, ping) and the
+# rest, for the select acknowledge, for the start of a reply, for a whole resync, and
+# for the ESP32 to boot after a reset
+_DEADLINES = {
+    "poll": 10,
+    "connect": 10,
+    "command": 10,
+    "select": 1,
+    "reply_start": 0.1,
+    "resync": 1,
+    "boot": 1,
+}
+# how long a single probe of a booting ESP32 may take
+_BOOT_PROBE_TIMEOUT = 0.1
+# drain and verify attempts of a resync before falling back to a reset
+_RESYNC_ATTEMPTS = const(3)
+# socket numbers the firmware hands out, checked for leftovers when attaching
+_MAX_SOCKETS = const(10)
+# SPI clock rates calibrate_baudrate steps up through
+_CALIBRATION_BAUDRATES = (8000000, 12000000, 16000000, 20000000)
+# upper bounds of the command latency histogram buckets in stats, the last bucket
+# counts everything slower
+_LATENCY_BUCKETS_US = (100, 250, 500, 1000, 2500, 5000, 10000, 100000, 1000000)
+# command path methods swapped for their _traced variants while tracing, so the
+# untraced path carries no tracing code at all
+_TRACED_METHODS = (
+    "_wait_for_ready",
+    "_build_frame",
+    "_write_frame",
+    "_read_byte",
+    "_read_bytes",
+    "_wait_response_cmd",
+    "_wait_response_arena",
+    "_wait_response_into",
+)
+# methods that must not interleave with another thread's commands, run under the lock
+# of a driver created with one. They call each other, hence _ReentrantLock
+_LOCKED_METHODS = (
+    "_send_command_get_response",
+    "_send_command_get_arena_response",
+    "_send_command_get_response_into",
+    "_drain",
+    "_new_socket",
+    "reset",
+    "calibrate_baudrate",
+)
+
+
+class CommandError(BrokenPipeError):
+    """The ESP32 answered a command with an error response: the firmware could not
+    handle it, as opposed to a reply that got garbled on the way"""
+
+
+class _ReentrantLock:
+    """Wraps a lock so the thread holding it can take it again, as the locked methods
+    calling each other do. Works the same over a ``threading.Lock`` or an ``RLock``.
+
+    :param lock: The lock to wrap
+    :param get_ident: ``threading.get_ident``, telling the calling thread apart
+    """
+
+    def __init__(self, lock, get_ident):
+        self._lock = lock
+        self._get_ident = get_ident
+        self._owner = None
+        self._count = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        """Take the lock, see ``threading.Lock.acquire``"""
+        me = self._get_ident()
+        if self._owner == me:
+            self._count += 1
+            return True
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._owner = me
+        self._count = 1
+        return True
+
+    def release(self):
+        """Give back one acquire, the lock once they all are"""
+        if self._owner != self._get_ident():
+            raise RuntimeError("Lock not held by this thread")
+        self._count -= 1
+        if not self._count:
+            self._owner = None
+            self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
 
 class Network:
     """A wifi network provided by a nearby access point."""
@@ -154,7 +340,7 @@ class Network:
         self._raw_authmode = raw_authmode
 
     def _get_response(self, cmd):
-        respose = self._esp_spi_control._send_command_get_response(cmd, [b"\xff"])
+        respose = self._esp_spi_control._send_command_get_response(cmd)
         return respose[0]
 
     @property
@@ -219,6 +405,190 @@ class Network:
         return "UNKNOWN"
 
 
+def _parse_version(version):
+    """The leading numbers of each part of a version string, "1.7.4" as (1, 7, 4)"""
+    numbers = []
+    for part in version.split("."):
+        digits = 0
+        for char in part:
+            if not char.isdigit():
+                break
+            digits = digits * 10 + ord(char) - 48
+        numbers.append(digits)
+    return tuple(numbers)
+
+
+class SpinWait:
+    """Waits for the ESP32 ready line by polling it in a tight loop, the lowest latency
+    way to wait and the default. Also the base of the other wait strategies, pass any
+    of them to `ESP_SPIcontrol` as ``ready_wait``.
+
+    Every strategy keeps `metrics` on the waits that actually had to wait, the line
+    being at the wanted level already costs nothing."""
+
+    def __init__(self):
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        """Clear the metrics collected so far"""
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_ns = 0
+        self._max_wait_ns = 0
+
+    @property
+    def metrics(self):
+        """A dict with the number of ``waits``, how many of them were ``timeouts``, and
+        the total and longest time spent waiting, ``wait_us`` and ``max_wait_us``"""
+        return {
+            "waits": self._waits,
+            "timeouts": self._timeouts,
+            "wait_us": self._wait_ns // 1000,
+            "max_wait_us": self._max_wait_ns // 1000,
+        }
+
+    def wait(self, pin, value, timeout):
+        """Wait up to timeout seconds for pin.value to become value, returns whether
+        it did"""
+        start = time.monotonic_ns()
+        reached = self._wait(pin, value, start + int(timeout * 1e9))
+        elapsed = time.monotonic_ns() - start
+        self._waits += 1
+        if not reached:
+            self._timeouts += 1
+        self._wait_ns += elapsed
+        self._max_wait_ns = max(self._max_wait_ns, elapsed)
+        return reached
+
+    def _wait(self, pin, value, deadline):  # noqa: PLR6301
+        """Wait for the pin until the deadline in monotonic_ns, returns whether it got
+        to value"""
+        while pin.value != value:
+            if time.monotonic_ns() >= deadline:
+                return False
+        return True
+
+
+class BackoffWait(SpinWait):
+    """Polls the ready line in a tight loop for spin seconds, then sleeps between polls,
+    starting at min_sleep seconds and doubling up to max_sleep. Fast replies are seen
+    just as quickly as with `SpinWait`, while slow ones (connecting, DNS, ...) leave
+    the CPU to other work. `metrics` also counts the ``sleeps``."""
+
+    def __init__(self, spin=0.001, min_sleep=0.0005, max_sleep=0.005):
+        self.spin = spin
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        super().__init__()
+
+    def reset_metrics(self):
+        """Clear the metrics collected so far"""
+        super().reset_metrics()
+        self._sleeps = 0
+
+    @property
+    def metrics(self):
+        """`SpinWait.metrics`, plus the number of ``sleeps``"""
+        metrics = super().metrics
+        metrics["sleeps"] = self._sleeps
+        return metrics
+
+    def _wait(self, pin, value, deadline):
+        spin_until = time.monotonic_ns() + int(self.spin * 1e9)
+        sleep = self.min_sleep
+        while pin.value != value:
+            now = time.monotonic_ns()
+            if now >= deadline:
+                return False
+            if now >= spin_until:
+                time.sleep(sleep)
+                self._sleeps += 1
+                sleep = min(sleep * 2, self.max_sleep)
+        return True
+
+
+class EdgeWait(SpinWait):
+    """Leaves the waiting to wait_for_edge(pin, value, timeout), a function that blocks
+    until pin.value is value or timeout seconds have passed, for example on an edge
+    interrupt or a Linux GPIO edge event, so nothing is polled at all. The level is
+    checked again whenever it returns, until the deadline."""
+
+    def __init__(self, wait_for_edge):
+        self._wait_for_edge = wait_for_edge
+        super().__init__()
+
+    def _wait(self, pin, value, deadline):
+        while pin.value != value:
+            remaining = deadline - time.monotonic_ns()
+            if remaining <= 0:
+                return False
+            self._wait_for_edge(pin, value, remaining / 1e9)
+        return True
+
+
+class SPITransport:
+    """The byte level link to the ESP32 that `ESP_SPIcontrol` sends its commands over:
+    an SPI bus with a chip select pin, plus the ready, reset and optional GPIO0 pins.
+
+    Other transports (a Linux spidev fast path, an in-memory loopback, a recorder, ...)
+    can be passed to `ESP_SPIcontrol` instead, as long as they provide the same three
+    things:
+
+    * ``ready``, an object whose ``value`` is the level of the ESP32 ready line, low
+      when the ESP32 can take a command and high once it acknowledges a select
+    * use as a context manager that selects the ESP32 for one transaction, giving a
+      bus with ``write(buf, *, start=0, end=None)`` and
+      ``readinto(buf, *, start=0, end=None)``
+    * ``reset()``, which pulses the ESP32 reset line
+
+    and optionally a ``baudrate`` property for the clock rate of the link.
+    """
+
+    def __init__(self, spi, cs_dio, ready_dio, reset_dio, gpio0_dio=None, *, baudrate=8000000):
+        self._spi = spi
+        self._device = SPIDevice(spi, cs_dio, baudrate=baudrate)
+        self._baudrate = baudrate
+        self._cs = cs_dio
+        self.ready = ready_dio
+        """The ESP32 ready pin"""
+        self._reset = reset_dio
+        self._gpio0 = gpio0_dio
+        # start both high, so a running ESP32 is neither selected nor reset
+        self._cs.switch_to_output(value=True)
+        self.ready.direction = Direction.INPUT
+        self._reset.switch_to_output(value=True)
+        if self._gpio0:
+            self._gpio0.direction = Direction.INPUT
+
+    @property
+    def baudrate(self):
+        """The SPI clock rate requested for transactions with the ESP32"""
+        return self._baudrate
+
+    @baudrate.setter
+    def baudrate(self, baudrate):
+        self._device = SPIDevice(self._spi, self._cs, baudrate=baudrate)
+        self._baudrate = baudrate
+
+    def __enter__(self):
+        return self._device.__enter__()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self._device.__exit__(exc_type, exc_val, exc_tb)
+
+    def reset(self):
+        """Pulse the reset pin, keeping GPIO0 high so the ESP32 doesn't bootload"""
+        if self._gpio0:
+            self._gpio0.direction = Direction.OUTPUT
+            self._gpio0.value = True  # not bootload mode
+        self._cs.value = True
+        self._reset.value = False
+        time.sleep(0.01)  # reset
+        self._reset.value = True
+        if self._gpio0:
+            self._gpio0.direction = Direction.INPUT
+
+
 class ESP_SPIcontrol:
     """A class that will talk to an ESP32 module programmed with special firmware
     that lets it act as a fast an efficient WiFi co-processor"""
@@ -229,14 +599,23 @@ class ESP_SPIcontrol:
 
     def __init__(
         self,
-        spi,
-        cs_dio,
-        ready_dio,
-        reset_dio,
+        spi=None,
+        cs_dio=None,
+        ready_dio=None,
+        reset_dio=None,
         gpio0_dio=None,
         *,
         debug=False,
         debug_show_secrets=False,
+        write_chunk_size=_MIN_WRITE_CHUNK_SIZE,
+        stats=False,
+        trace=None,
+        transport=None,
+        baudrate=8000000,
+        ready_wait=None,
+        deadlines=None,
+        attach=False,
+        lock=None,
     ):
         self._debug = debug
         self._debug_show_secrets = debug_show_secrets
@@ -245,124 +624,464 @@ class ESP_SPIcontrol:
         self._buffer = bytearray(10)
         self._pbuf = bytearray(1)  # buffer for param read
         self._sendbuf = bytearray(256)  # buffer for command sending
-        self._socknum_ll = [[0]]  # pre-made list of list of socket #
-
-        self._spi_device = SPIDevice(spi, cs_dio, baudrate=8000000)
-        self._cs = cs_dio
-        self._ready = ready_dio
-        self._reset = reset_dio
-        self._gpio0 = gpio0_dio
-        self._cs.direction = Direction.OUTPUT
-        self._ready.direction = Direction.INPUT
-        self._reset.direction = Direction.OUTPUT
+        self._sendview = memoryview(self._sendbuf)  # for copying params without a temporary
+        self._frames = {}  # prebuilt frames for commands with fixed parameters
+        self._arena = bytearray(_ARENA_SIZE)  # reused for fixed-shape replies
+        self._arena_offsets = [0] * _ARENA_PARAMS
+        self._arena_lengths = [0] * _ARENA_PARAMS
+        # lowered below any chunk size the firmware answers with an error
+        self._max_write_chunk_size = _MAX_WRITE_CHUNK_SIZE
+        self.write_chunk_size = write_chunk_size
+        # per command counters, see the stats property. None unless enabled
+        self._stats = {} if stats else None
+        self._stats_ready_ns = 0  # the command being recorded so far
+        self._stats_sent = 0
+        self._stats_received = 0
+        self._counters = {
+            "resyncs": 0,
+            "resync_resets": 0,
+            "lock_waits": 0,
+            "lock_wait_us": 0,
+            "recv_polls": 0,
+            "recv_idle_polls": 0,
+        }
+        self._boot_us = None  # how long the last reset took
+        self.trace = trace
+        self._ready_wait = SpinWait() if ready_wait is None else ready_wait
+        self._deadlines = dict(_DEADLINES)
+        self.deadlines = deadlines or {}
+        self._deadline = None  # monotonic_ns the current operation must be done by
+        self._lock = lock
+        if lock is not None:
+            self._use_lock()
+
+        if transport is None:
+            transport = SPITransport(
+                spi, cs_dio, ready_dio, reset_dio, gpio0_dio, baudrate=baudrate
+            )
+        self._transport = transport
+        self._ready = transport.ready
         # Only one TLS socket at a time is supported so track when we already have one.
         self._tls_socket = None
-        if self._gpio0:
-            self._gpio0.direction = Direction.INPUT
-        self.reset()
+        self._capabilities = None  # probed when first needed, see capabilities
+        self.attached = attach and self._attach()
+        """Whether the ESP32 was taken over as it was, keeping its network connection,
+        instead of being reset. Only tried when created with ``attach=True``"""
+        if not self.attached:
+            self.reset()
 
     # pylint: enable=too-many-arguments
 
     def reset(self):
-        """Hard reset the ESP32 using the reset pin"""
+        """Hard reset the ESP32 using the reset pin, and wait for it to boot up"""
         if self._debug:
             print("Reset ESP32")
-        if self._gpio0:
-            self._gpio0.direction = Direction.OUTPUT
-            self._gpio0.value = True  # not bootload mode
-        self._cs.value = True
-        self._reset.value = False
-        time.sleep(0.01)  # reset
-        self._reset.value = True
-        time.sleep(0.75)  # wait for it to boot up
-        if self._gpio0:
-            self._gpio0.direction = Direction.INPUT
+        self.attached = False
+        self._capabilities = None
+        self._transport.reset()
+        self._wait_for_boot()
+
+    def _attach(self):
+        """Check whether an ESP32 that kept running, across a soft reload of the code
+        for example, can be used as it is: it has to answer a status command, after
+        any reply the last run left behind is drained, and if it is connected to an
+        access point it must still have an IP address. Client sockets the last run
+        left open are closed, servers it left listening are kept. Returns False if the
+        ESP32 should be reset instead"""
+        previous = self._start_operation(self._deadlines["resync"])
+        try:
+            usable = self._probe_running()
+        except OSError:
+            usable = False
+        finally:
+            self._end_operation(previous)
+        if self._debug and usable:
+            print("Attached to running ESP32")
+        return usable
+
+    def _probe_running(self):
+        for _ in range(_RESYNC_ATTEMPTS):
+            try:
+                if self._drain():
+                    status = self.status
+                    break
+            except OSError:  # not running, or still out of step
+                pass
+        else:
+            return False
+        if status == WL_CONNECTED and not any(self.ip_address):
+            return False
+        for socket_num in range(_MAX_SOCKETS):
+            if self.socket_status(socket_num) not in {SOCKET_CLOSED, SOCKET_LISTEN}:
+                self.socket_close(socket_num)
+        return True
+
+    def _wait_for_boot(self):
+        """Wait for the ESP32 to boot up: once the ready line goes low, probe it with
+        status commands until one goes through, for at most the "boot" deadline.
+        Records how long that took for stats"""
+        start = time.monotonic_ns()
+        deadline = start + int(self._deadlines["boot"] * 1e9)
+        self._boot_us = None
+        while True:
+            remaining = (deadline - time.monotonic_ns()) / 1e9
+            if remaining <= 0:
+                break
+            previous = self._start_operation(min(remaining, _BOOT_PROBE_TIMEOUT))
+            try:
+                self._send_command_get_arena_response(_GET_CONN_STATUS_CMD)
+                self._boot_us = (time.monotonic_ns() - start) // 1000
+                break
+            except OSError:  # not up yet
+                time.sleep(0.01)
+            finally:
+                self._end_operation(previous)
+        if self._debug:
+            if self._boot_us is None:
+                print("ESP32 did not answer after reset")
+            else:
+                print(f"ESP32 booted in {self._boot_us / 1000}ms")
 
-    def _wait_for_ready(self):
-        """Wait until the ready pin goes low"""
-        if self._debug >= 3:
-            print("Wait for ESP32 ready", end="")
-        times = time.monotonic()
-        while (time.monotonic() - times) < 10:  # wait up to 10 seconds
-            if not self._ready.value:  # we're ready!
+    @property
+    def baudrate(self):
+        """The SPI clock rate used to talk to the ESP32, 8MHz unless set otherwise.
+        Bulk transfers scale almost linearly with it, but how fast is reliable depends
+        on the board, see `calibrate_baudrate`."""
+        return self._transport.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baudrate):
+        self._transport.baudrate = baudrate
+
+    def calibrate_baudrate(self, baudrates=_CALIBRATION_BAUDRATES, *, rounds=3):
+        """Step the SPI clock up through the rates in baudrates that are faster than the
+        current one, checking at each that `firmware_version` and `MAC_address` read
+        back the same as they do now, rounds times over. Settles on the fastest rate
+        that passed and returns it. Should the ESP32 no longer answer once back at
+        that rate after a failed step, it is reset."""
+        good = self.baudrate
+        expected = (self.firmware_version, bytes(self.MAC_address))
+        for baudrate in sorted(baudrates):
+            if baudrate <= good:
+                continue
+            self.baudrate = baudrate
+            if not self._verify_link(expected, rounds):
                 break
-            if self._debug >= 3:
-                print(".", end="")
-                time.sleep(0.05)
-        else:
-            raise TimeoutError("ESP32 not responding")
-        if self._debug >= 3:
-            print()
+            good = baudrate
+        if self.baudrate != good:
+            self.baudrate = good
+            if not self._verify_link(expected, 1):
+                self.reset()
+        if self._debug:
+            print(f"SPI clock calibrated to {good}")
+        return good
+
+    def _verify_link(self, expected, rounds):
+        """Check, rounds times, that the firmware version and MAC address read back
+        as expected"""
+        try:
+            for _ in range(rounds):
+                if (self.firmware_version, bytes(self.MAC_address)) != expected:
+                    return False
+        except (OSError, ValueError):  # garbled replies fail to parse or decode
+            return False
+        return True
+
+    @property
+    def ready_wait(self):
+        """How the driver waits on the ESP32 ready line: a `SpinWait` (the default),
+        `BackoffWait` or `EdgeWait`. Its ``metrics`` tell how long waiting took"""
+        return self._ready_wait
+
+    @ready_wait.setter
+    def ready_wait(self, ready_wait):
+        self._ready_wait = ready_wait
 
-    def _send_command(self, cmd, params=None, *, param_len_16=False):
-        """Send over a command with a list of parameters"""
-        if not params:
-            params = ()
+    @property
+    def deadlines(self):
+        """How long, in seconds, to wait for the ESP32 before giving up: a dict of
+        ``poll`` (status and socket polls), ``connect`` (joining networks, opening
+        sockets, DNS lookups, scans and pings) and ``command`` (everything else) for
+        the ESP32 to be ready, ``select`` for it to acknowledge a select,
+        ``reply_start`` for a reply to start, ``resync`` for all of a `resync` and
+        ``boot`` for the ESP32 to answer after a `reset`.
+        Setting it only changes the entries given. Operations given a timeout check it
+        before every command they send, a command already sent is still waited out to
+        its deadline so that its reply isn't left behind for the next one."""
+        return dict(self._deadlines)
+
+    @deadlines.setter
+    def deadlines(self, deadlines):
+        for name, seconds in deadlines.items():
+            if name not in self._deadlines:
+                raise ValueError(f"Unknown deadline {name}")
+            if seconds <= 0:
+                raise ValueError("Deadlines must be positive")
+            self._deadlines[name] = seconds
+        self._timeouts = {}
+        for cmd, entry in _COMMANDS.items():
+            if entry[3] & _CMD_POLL:
+                self._timeouts[cmd] = self._deadlines["poll"]
+            elif entry[3] & _CMD_CONNECT:
+                self._timeouts[cmd] = self._deadlines["connect"]
+            else:
+                self._timeouts[cmd] = self._deadlines["command"]
+        self._timeout = self._deadlines["command"]
+        self._select_timeout = self._deadlines["select"]
+        self._reply_start_tries = max(1, int(self._deadlines["reply_start"] / 0.01))
+
+    def _start_operation(self, timeout):
+        """Hold everything until the matching _end_operation to timeout seconds (None
+        for no limit), nested operations can only shorten that. Returns what to pass
+        to _end_operation"""
+        previous = self._deadline
+        if timeout is not None:
+            deadline = time.monotonic_ns() + int(timeout * 1e9)
+            if previous is None or deadline < previous:
+                self._deadline = deadline
+        return previous
+
+    def _end_operation(self, previous):
+        """Back to the deadline from before _start_operation"""
+        self._deadline = previous
+
+    def _check_deadline(self):
+        """Raise TimeoutError once the current operation is out of time"""
+        if self._deadline is not None and time.monotonic_ns() >= self._deadline:
+            raise TimeoutError("Operation timed out")
+
+    def _wait_timeout(self, timeout):
+        """timeout, cut short to what's left of the current operation"""
+        if self._deadline is None:
+            return timeout
+        return max(0, min(timeout, (self._deadline - time.monotonic_ns()) / 1e9))
+
+    @property
+    def lock(self):
+        """The lock every command runs under, or None. A driver created with
+        ``lock=threading.RLock()`` can be shared by several threads: each command and
+        its reply go through as one, and operation timeouts are per thread. Without a
+        lock, the command path doesn't do any locking at all.
+
+        This is the lock passed in wrapped so the thread holding it can take it again,
+        which the driver does, so a plain ``threading.Lock()`` works too. Hold this
+        one, not the lock passed in, to run several commands with no other thread's
+        in between."""
+        return self._lock
+
+    def _use_lock(self):
+        """Run every command under the lock, with the operation deadlines kept per
+        thread so one thread's timeout doesn't cut another's commands short"""
+        import threading  # noqa: PLC0415, only hosts with threads get here
+
+        self._lock = _ReentrantLock(self._lock, threading.get_ident)
+        self._local = threading.local()
+        for name in _LOCKED_METHODS:
+            setattr(self, name, self._locked(getattr(self, name)))
+        for name in ("_start_operation", "_end_operation", "_check_deadline", "_count"):
+            setattr(self, name, getattr(self, "_threaded" + name))
+
+    def _locked(self, method):
+        """method, run under the lock with the calling thread's deadline"""
+        lock = self._lock
+        local = self._local
+        counters = self._counters
+
+        def locked(*args, **kwargs):
+            start = time.monotonic_ns()
+            with lock:
+                counters["lock_waits"] += 1
+                counters["lock_wait_us"] += (time.monotonic_ns() - start) // 1000
+                outer = self._deadline
+                self._deadline = getattr(local, "deadline", None)
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self._deadline = outer
+
+        return locked
+
+    def _threaded_start_operation(self, timeout):
+        """_start_operation, for the calling thread"""
+        previous = getattr(self._local, "deadline", None)
+        if timeout is not None:
+            deadline = time.monotonic_ns() + int(timeout * 1e9)
+            if previous is None or deadline < previous:
+                self._local.deadline = deadline
+        return previous
+
+    def _threaded_end_operation(self, previous):
+        """_end_operation, for the calling thread"""
+        self._local.deadline = previous
+
+    def _threaded_check_deadline(self):
+        """_check_deadline, for the calling thread"""
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is not None and time.monotonic_ns() >= deadline:
+            raise TimeoutError("Operation timed out")
+
+    def _count(self, name):
+        """Add one to the counter name, see stats"""
+        self._counters[name] += 1
+
+    def _threaded_count(self, name):
+        """_count, under the lock so no other thread's count gets lost"""
+        with self._lock:
+            self._counters[name] += 1
 
+    @property
+    def write_chunk_size(self):
+        """The largest number of bytes `socket_write` sends per SPI command, 64 up to
+        the "max_write_chunk_size" in `capabilities`. Larger chunks mean fewer round
+        trips for big writes. If the firmware answers a chunk with an error, this and
+        the maximum are lowered to half that chunk (down to 64) and it is retried."""
+        return self._write_chunk_size
+
+    @write_chunk_size.setter
+    def write_chunk_size(self, size):
+        if not _MIN_WRITE_CHUNK_SIZE <= size <= self._max_write_chunk_size:
+            raise ValueError(
+                f"write_chunk_size must be {_MIN_WRITE_CHUNK_SIZE} to "
+                + f"{self._max_write_chunk_size}"
+            )
+        self._write_chunk_size = size
+        # socket number and data parameters with 16 bit lengths, padded to 4 bytes
+        frame_len = (size + 9 + 3) & ~3
+        if frame_len > len(self._sendbuf):
+            self._reserve_sendbuf(frame_len)
+
+    def _chunk_rejected(self, size):
+        """The firmware answered a socket_write chunk of size bytes with an error: lower
+        write_chunk_size, and the most it may be set to, to half that. Returns False if
+        it can't go any lower"""
+        if size <= _MIN_WRITE_CHUNK_SIZE:
+            return False
+        self._write_chunk_size = self._max_write_chunk_size = max(_MIN_WRITE_CHUNK_SIZE, size // 2)
+        if self._debug:
+            print(f"Write chunk size lowered to {self._write_chunk_size}")
+        return True
+
+    def _wait_for_ready(self, timeout):
+        """Wait up to timeout seconds until the ready pin goes low"""
+        if self._stats is not None:
+            start = time.monotonic_ns()
+        # unless we're ready already
+        if self._ready.value and not self._ready_wait.wait(self._ready, False, timeout):
+            raise TimeoutError("ESP32 not responding")
+        if self._stats is not None:
+            self._stats_ready_ns += time.monotonic_ns() - start
+
+    def _wait_for_select(self, timeout):
+        """Wait up to timeout seconds until the ESP32 acknowledges chip select by
+        raising the ready pin"""
+        # unless it's acknowledged already
+        if not self._ready.value and not self._ready_wait.wait(self._ready, True, timeout):
+            raise TimeoutError("ESP32 timed out on SPI select")
+
+    def _reserve_sendbuf(self, length):
+        """Make sure the command buffer can hold a frame of length bytes. The buffer
+        only ever grows, in powers of two, so steady-state commands never allocate"""
+        size = len(self._sendbuf)
+        while size < length:
+            size <<= 1
+        self._sendbuf = bytearray(max(length, min(size, _MAX_FRAME_LEN)))
+        self._sendview = memoryview(self._sendbuf)
+
+    def _build_frame(self, cmd, params, param_len_16):
+        """Frame a command with a list of parameters into the send buffer,
+        returns the length of the frame"""
+        len_bytes = 2 if param_len_16 else 1
         packet_len = 4  # header + end byte
-        for i, param in enumerate(params):
-            packet_len += len(param)  # parameter
-            packet_len += 1  # size byte
-            if param_len_16:
-                packet_len += 1  # 2 of em here!
-        while packet_len % 4 != 0:
-            packet_len += 1
+        for param in params:
+            packet_len += len(param) + len_bytes  # parameter and its size byte(s)
+        packet_len = (packet_len + 3) & ~3  # pad to a multiple of 4 bytes
         # we may need more space
         if packet_len > len(self._sendbuf):
-            self._sendbuf = bytearray(packet_len)
+            self._reserve_sendbuf(packet_len)
+        sendbuf = self._sendbuf
 
-        self._sendbuf[0] = _START_CMD
-        self._sendbuf[1] = cmd & ~_REPLY_FLAG
-        self._sendbuf[2] = len(params)
+        sendbuf[0] = _START_CMD
+        sendbuf[1] = cmd & ~_REPLY_FLAG
+        sendbuf[2] = len(params)
 
         # handle parameters here
         ptr = 3
-        for i, param in enumerate(params):
-            if self._debug >= 2:
-                print(f"\tSending param #{i} is {len(param)} bytes long")
+        for i in range(len(params)):
+            param = params[i]
+            param_len = len(param)
             if param_len_16:
-                self._sendbuf[ptr] = (len(param) >> 8) & 0xFF
+                sendbuf[ptr] = (param_len >> 8) & 0xFF
                 ptr += 1
-            self._sendbuf[ptr] = len(param) & 0xFF
+            sendbuf[ptr] = param_len & 0xFF
             ptr += 1
-            for j, par in enumerate(param):
-                self._sendbuf[ptr + j] = par
-            ptr += len(param)
-        self._sendbuf[ptr] = _END_CMD
-
-        self._wait_for_ready()
-        with self._spi_device as spi:
-            times = time.monotonic()
-            while (time.monotonic() - times) < 1:  # wait up to 1000ms
-                if self._ready.value:  # ok ready to send!
-                    break
-            else:
-                raise TimeoutError("ESP32 timed out on SPI select")
-            spi.write(self._sendbuf, start=0, end=packet_len)
-            if self._debug >= 3:
-                print("Wrote: ", [hex(b) for b in self._sendbuf[0:packet_len]])
+            if isinstance(param, (bytes, bytearray, memoryview)):
+                self._sendview[ptr : ptr + param_len] = param
+            else:  # short tuples or lists of ints
+                for j in range(param_len):
+                    sendbuf[ptr + j] = param[j]
+            ptr += param_len
+        sendbuf[ptr] = _END_CMD
+        # clear the padding too, so a command always goes out as the same frame
+        for pad in range(ptr + 1, packet_len):
+            sendbuf[pad] = 0
+        return packet_len
+
+    def _prebuilt_frame(self, cmd):
+        """The frame of a command whose parameters never change, built on first use"""
+        frame = self._frames.get(cmd)
+        if frame is None:
+            params, _, _, flags = _COMMANDS[cmd]
+            if params is None:
+                raise ValueError(f"Command 0x{cmd:02X} needs parameters")
+            packet_len = self._build_frame(cmd, params, flags & _CMD_SENT_LEN_16)
+            frame = bytearray(self._sendview[:packet_len])
+            self._frames[cmd] = frame
+        return frame
+
+    def _send_command(self, cmd, params=None, *, socket_num=None):
+        """Send over a command with a list of parameters, framed as the command table
+        describes it. Without params, commands with fixed parameters in the table go
+        out as a prebuilt frame, with socket_num patched in for per-socket commands"""
+        self._timeout = self._timeouts[cmd]
+        if params is None:
+            frame = self._prebuilt_frame(cmd)
+            if socket_num is not None:
+                frame[_SOCKET_FRAME_OFFSET] = socket_num
+            self._write_frame(frame, len(frame))
+            return
+        packet_len = self._build_frame(cmd, params, _COMMANDS[cmd][3] & _CMD_SENT_LEN_16)
+        self._write_frame(self._sendbuf, packet_len)
+
+    def _write_frame(self, frame, packet_len):
+        """Wait for the ESP32, then send it a framed command. This is the last point
+        the current operation's deadline can stop a command at: once the frame is out
+        its reply has to be read, or the ESP32 would hand it out in place of the reply
+        to the next command"""
+        self._check_deadline()
+        self._wait_for_ready(self._wait_timeout(self._timeout))
+        with self._transport as spi:
+            self._wait_for_select(self._wait_timeout(self._select_timeout))
+            spi.write(frame, start=0, end=packet_len)
+        if self._stats is not None:
+            self._stats_sent += packet_len
 
     def _read_byte(self, spi):
         """Read one byte from SPI"""
         spi.readinto(self._pbuf)
-        if self._debug >= 3:
-            print("\t\tRead:", hex(self._pbuf[0]))
         return self._pbuf[0]
 
-    def _read_bytes(self, spi, buffer, start=0, end=None):
+    def _read_bytes(self, spi, buffer, start=0, end=None):  # noqa: PLR6301
         """Read many bytes from SPI"""
         if not end:
             end = len(buffer)
         spi.readinto(buffer, start=start, end=end)
-        if self._debug >= 3:
-            print("\t\tRead:", [hex(i) for i in buffer])
 
     def _wait_spi_char(self, spi, desired):
         """Read a byte with a retry loop, and if we get it, check that its what we expect"""
-        for _ in range(10):
+        for _ in range(self._reply_start_tries):
             r = self._read_byte(spi)
             if r == _ERR_CMD:
-                raise BrokenPipeError("Error response to command")
+                raise CommandError("Error response to command")
             if r == desired:
                 return True
             time.sleep(0.01)
@@ -376,16 +1095,11 @@ class ESP_SPIcontrol:
 
     def _wait_response_cmd(self, cmd, num_responses=None, *, param_len_16=False):
         """Wait for ready, then parse the response"""
-        self._wait_for_ready()
+        self._wait_for_ready(self._timeout)
 
         responses = []
-        with self._spi_device as spi:
-            times = time.monotonic()
-            while (time.monotonic() - times) < 1:  # wait up to 1000ms
-                if self._ready.value:  # ok ready to send!
-                    break
-            else:
-                raise TimeoutError("ESP32 timed out on SPI select")
+        with self._transport as spi:
+            self._wait_for_select(self._select_timeout)
 
             self._wait_spi_char(spi, _START_CMD)
             self._check_data(spi, cmd | _REPLY_FLAG)
@@ -398,29 +1112,343 @@ class ESP_SPIcontrol:
                 if param_len_16:
                     param_len <<= 8
                     param_len |= self._read_byte(spi)
-                if self._debug >= 2:
-                    print(f"\tParameter #{num} length is {param_len}")
                 response = bytearray(param_len)
                 self._read_bytes(spi, response)
                 responses.append(response)
             self._check_data(spi, _END_CMD)
 
-        if self._debug >= 2:
-            print(f"Read {len(responses[0])}: ", responses)
+        if self._stats is not None:
+            # start, command, count and end, then every parameter with its length
+            received = 4
+            for response in responses:
+                received += len(response) + (2 if param_len_16 else 1)
+            self._stats_received += received
         return responses
 
-    def _send_command_get_response(
-        self,
-        cmd,
-        params=None,
-        *,
-        reply_params=1,
-        sent_param_len_16=False,
-        recv_param_len_16=False,
+    def _check_frame_byte(self, offset, desired):
+        """Verify a byte of a reply frame already read into the arena"""
+        if self._arena[offset] != desired:
+            raise BrokenPipeError(f"Expected {desired:02X} but got {self._arena[offset]:02X}")
+
+    def _wait_response_arena(self, cmd, num_responses=1, *, param_len_16=False, reply_len=None):
+        """Wait for ready, then read the response into the response arena and validate it
+        in place, without allocating. Read the parameters with the _response_* accessors,
+        they are only valid until the next command.
+
+        After the start byte, the header and first length are pulled in with a single
+        transfer, then each parameter together with whatever follows it. When reply_len,
+        the expected total length of the parameters, is given the whole frame is read at
+        once. A wrong guess is harmless, anything missing is read afterwards."""
+        self._wait_for_ready(self._timeout)
+
+        arena = self._arena
+        len_bytes = 2 if param_len_16 else 1
+        if reply_len is None:
+            read_len = 2 + (len_bytes if num_responses else 1)
+        else:
+            read_len = min(2 + num_responses * len_bytes + reply_len + 1, _ARENA_SIZE)
+        with self._transport as spi:
+            self._wait_for_select(self._select_timeout)
+
+            self._wait_spi_char(spi, _START_CMD)
+            self._read_bytes(spi, arena, 0, read_len)
+            self._check_frame_byte(0, cmd | _REPLY_FLAG)
+            self._check_frame_byte(1, num_responses)
+            ptr = 2
+            for num in range(num_responses):
+                param_len = arena[ptr]
+                if param_len_16:
+                    param_len = (param_len << 8) | arena[ptr + 1]
+                ptr += len_bytes
+                self._arena_offsets[num] = ptr
+                self._arena_lengths[num] = param_len
+                ptr += param_len
+                # this parameter plus the next length, or the end byte
+                end = ptr + (len_bytes if num + 1 < num_responses else 1)
+                if end > _ARENA_SIZE:
+                    raise BrokenPipeError(f"Response too large for arena ({param_len} bytes)")
+                if end > read_len:
+                    self._read_bytes(spi, arena, read_len, end)
+                    read_len = end
+            self._check_frame_byte(ptr, _END_CMD)
+
+        if self._stats is not None:
+            self._stats_received += ptr + 2  # the arena starts after the start byte
+
+    def _response_u16(self, num=0):
+        """Response parameter num in the arena, as a little endian 16 bit number.
+        A one byte parameter is returned as is"""
+        offset = self._arena_offsets[num]
+        if self._arena_lengths[num] < 2:
+            return self._arena[offset]
+        return self._arena[offset] | (self._arena[offset + 1] << 8)
+
+    def _wait_response_into(self, cmd, buffer, *, param_len_16=False):
+        """Wait for ready, then read a single parameter response straight into buffer.
+        Returns the length of the parameter"""
+        self._wait_for_ready(self._timeout)
+
+        with self._transport as spi:
+            self._wait_for_select(self._select_timeout)
+
+            self._wait_spi_char(spi, _START_CMD)
+            # command, parameter count and length in one go
+            self._read_bytes(spi, self._arena, 0, 4 if param_len_16 else 3)
+            self._check_frame_byte(0, cmd | _REPLY_FLAG)
+            self._check_frame_byte(1, 1)
+            param_len = self._arena[2]
+            if param_len_16:
+                param_len = (param_len << 8) | self._arena[3]
+            size = min(param_len, len(buffer))
+            if size:
+                self._read_bytes(spi, buffer, end=size)
+            for _ in range(param_len - size):  # more than we asked for, drop it
+                self._read_byte(spi)
+            self._check_data(spi, _END_CMD)
+        if self._stats is not None:
+            self._stats_received += (6 if param_len_16 else 5) + param_len
+        return size
+
+    @property
+    def trace(self):
+        """A function called as ``trace(event, data)`` at every step of the SPI command
+        path, or None. The events are ``"wait_ready"`` (data is None), ``"send"`` (the
+        parameters of a command being framed), ``"write"`` (the frame sent), ``"read"``
+        (a byte, or the bytes, read) and ``"reply"`` (the parameters of a reply). Data
+        is only valid during the call. Without a trace function, a ``debug`` level of 2
+        or more prints these, otherwise the command path runs with no tracing at all."""
+        return self._trace
+
+    @trace.setter
+    def trace(self, trace):
+        if trace is None and self._debug >= 2:
+            trace = self._print_trace
+        self._trace = trace
+        for name in _TRACED_METHODS:
+            if trace is None:
+                try:
+                    delattr(self, name)  # back to the plain method
+                except AttributeError:
+                    pass
+            else:
+                setattr(self, name, getattr(self, "_traced" + name))
+
+    def _print_trace(self, event, data):
+        """The trace function for debug levels 2 and up, prints the command path"""
+        if event == "send":
+            for i, param in enumerate(data):
+                print(f"\tSending param #{i} is {len(param)} bytes long")
+        elif event == "reply":
+            for num, param in enumerate(data):
+                print(f"\tParameter #{num} length is {len(param)}")
+            print(f"Read {len(data[0]) if data else 0}: ", [bytes(param) for param in data])
+        elif self._debug >= 3:
+            if event == "wait_ready":
+                print("Wait for ESP32 ready")
+            elif event == "write":
+                print("Wrote: ", [hex(b) for b in data])
+            elif isinstance(data, int):
+                print("\t\tRead:", hex(data))
+            else:
+                print("\t\tRead:", [hex(b) for b in data])
+
+    def _traced_wait_for_ready(self, timeout):
+        """_wait_for_ready, traced"""
+        self._trace("wait_ready", None)
+        ESP_SPIcontrol._wait_for_ready(self, timeout)
+
+    def _traced_build_frame(self, cmd, params, param_len_16):
+        """_build_frame, traced"""
+        self._trace("send", params)
+        return ESP_SPIcontrol._build_frame(self, cmd, params, param_len_16)
+
+    def _traced_write_frame(self, frame, packet_len):
+        """_write_frame, traced"""
+        ESP_SPIcontrol._write_frame(self, frame, packet_len)
+        self._trace("write", memoryview(frame)[:packet_len])
+
+    def _traced_read_byte(self, spi):
+        """_read_byte, traced"""
+        value = ESP_SPIcontrol._read_byte(self, spi)
+        self._trace("read", value)
+        return value
+
+    def _traced_read_bytes(self, spi, buffer, start=0, end=None):
+        """_read_bytes, traced"""
+        ESP_SPIcontrol._read_bytes(self, spi, buffer, start, end)
+        self._trace("read", memoryview(buffer)[start : end or len(buffer)])
+
+    def _traced_wait_response_cmd(self, cmd, num_responses=None, *, param_len_16=False):
+        """_wait_response_cmd, traced"""
+        responses = ESP_SPIcontrol._wait_response_cmd(
+            self, cmd, num_responses, param_len_16=param_len_16
+        )
+        self._trace("reply", responses)
+        return responses
+
+    def _traced_wait_response_arena(
+        self, cmd, num_responses=1, *, param_len_16=False, reply_len=None
     ):
-        """Send a high level SPI command, wait and return the response"""
-        self._send_command(cmd, params, param_len_16=sent_param_len_16)
-        return self._wait_response_cmd(cmd, reply_params, param_len_16=recv_param_len_16)
+        """_wait_response_arena, traced"""
+        ESP_SPIcontrol._wait_response_arena(
+            self, cmd, num_responses, param_len_16=param_len_16, reply_len=reply_len
+        )
+        arena = memoryview(self._arena)
+        self._trace(
+            "reply",
+            [
+                arena[
+                    self._arena_offsets[num] : self._arena_offsets[num] + self._arena_lengths[num]
+                ]
+                for num in range(num_responses)
+            ],
+        )
+
+    def _traced_wait_response_into(self, cmd, buffer, *, param_len_16=False):
+        """_wait_response_into, traced"""
+        size = ESP_SPIcontrol._wait_response_into(self, cmd, buffer, param_len_16=param_len_16)
+        self._trace("reply", [memoryview(buffer)[:size]])
+        return size
+
+    def _send_command_get_response(self, cmd, params=None, *, socket_num=None):
+        """Send a high level SPI command, wait and return the response, framed as the
+        command table describes it"""
+        if self._stats is not None:
+            return self._record_command(cmd, self._exchange, (cmd, params, socket_num))
+        return self._exchange(cmd, params, socket_num)
+
+    def _exchange(self, cmd, params, socket_num):
+        """Send a command and return its response, see _send_command_get_response"""
+        self._send_command(cmd, params, socket_num=socket_num)
+        return self._receive(cmd)
+
+    def _send_command_get_arena_response(self, cmd, params=None, *, socket_num=None):
+        """Send a high level SPI command, wait and parse the response into the
+        response arena, framed as the command table describes it. Returns the first
+        parameter of the reply as a one or two byte little endian number"""
+        if self._stats is not None:
+            return self._record_command(cmd, self._exchange_arena, (cmd, params, socket_num))
+        return self._exchange_arena(cmd, params, socket_num)
+
+    def _exchange_arena(self, cmd, params, socket_num):
+        """Send a command and parse its response into the arena"""
+        self._send_command(cmd, params, socket_num=socket_num)
+        return self._receive_arena(cmd)
+
+    def _receive(self, cmd):
+        """Wait for and return the response to cmd, framed as the command table
+        describes it"""
+        _, reply_params, _, flags = _COMMANDS[cmd]
+        return self._wait_response_cmd(cmd, reply_params, param_len_16=flags & _CMD_RECV_LEN_16)
+
+    def _receive_arena(self, cmd):
+        """Wait for the response to cmd and parse it into the arena, returns its first
+        parameter as a number"""
+        _, reply_params, reply_len, flags = _COMMANDS[cmd]
+        self._wait_response_arena(
+            cmd,
+            reply_params,
+            param_len_16=flags & _CMD_RECV_LEN_16,
+            reply_len=reply_len,
+        )
+        return self._response_u16()
+
+    def _send_command_get_response_into(self, cmd, params, buffer):
+        """Send a high level SPI command, wait and read its single parameter response
+        into buffer. Returns the length of the response"""
+        if self._stats is not None:
+            return self._record_command(cmd, self._exchange_into, (cmd, params, buffer))
+        return self._exchange_into(cmd, params, buffer)
+
+    def _exchange_into(self, cmd, params, buffer):
+        """Send a command and read its response into buffer"""
+        self._send_command(cmd, params)
+        return self._receive_into(cmd, buffer)
+
+    def _receive_into(self, cmd, buffer):
+        """Wait for the single parameter response to cmd and read it into buffer"""
+        return self._wait_response_into(
+            cmd, buffer, param_len_16=_COMMANDS[cmd][3] & _CMD_RECV_LEN_16
+        )
+
+    def _record_command(self, cmd, exchange, args):
+        """Run exchange(*args), a request and response of command cmd, and add it to
+        the stats"""
+        self._stats_ready_ns = self._stats_sent = self._stats_received = 0
+        start = time.monotonic_ns()
+        try:
+            result = exchange(*args)
+        except Exception:
+            self._add_stats(cmd, time.monotonic_ns() - start, error=True)
+            raise
+        self._add_stats(cmd, time.monotonic_ns() - start)
+        return result
+
+    def _add_stats(self, cmd, elapsed_ns, *, error=False):
+        """Add one command round trip to the stats"""
+        entry = self._stats.get(cmd)
+        if entry is None:
+            # calls, bytes sent, bytes received, ready wait, total time, errors, histogram
+            entry = [0, 0, 0, 0, 0, 0, [0] * (len(_LATENCY_BUCKETS_US) + 1)]
+            self._stats[cmd] = entry
+        entry[0] += 1
+        entry[1] += self._stats_sent
+        entry[2] += self._stats_received
+        entry[3] += self._stats_ready_ns
+        entry[4] += elapsed_ns
+        if error:
+            entry[5] += 1
+        elapsed_us = elapsed_ns // 1000
+        bucket = 0
+        while bucket < len(_LATENCY_BUCKETS_US) and elapsed_us > _LATENCY_BUCKETS_US[bucket]:
+            bucket += 1
+        entry[6][bucket] += 1
+
+    @property
+    def stats(self):
+        """A snapshot of the per command statistics, or None unless the driver was
+        created with ``stats=True``. A dict with a ``commands`` dict, keyed by command
+        byte, of ``calls``, ``bytes_sent``, ``bytes_received``, ``ready_wait_us`` (time
+        spent waiting for the ESP32 to be ready), ``total_us`` (full round trips),
+        ``errors`` and ``latency_histogram``, the number of calls per latency bucket.
+        The bucket upper bounds are in ``latency_buckets_us``, the last bucket counts
+        everything slower. ``ready_wait`` holds the `ready_wait` metrics, ``resyncs``
+        and ``resync_resets`` count the times `resync` got back in step with the ESP32
+        and had to reset it instead. ``boot_us`` is how long the ESP32 took to answer
+        after the last reset, None if it didn't within the ``boot`` deadline.
+        ``lock_waits`` and ``lock_wait_us`` count the commands run under the `lock` and
+        the time they spent waiting for it. ``recv_polls`` counts the checks for data
+        made by socket ``recv_into`` calls, ``recv_idle_polls`` the ones that found
+        none and backed off."""
+        if self._stats is None:
+            return None
+        commands = {}
+        for cmd, entry in self._stats.items():
+            commands[cmd] = {
+                "calls": entry[0],
+                "bytes_sent": entry[1],
+                "bytes_received": entry[2],
+                "ready_wait_us": entry[3] // 1000,
+                "total_us": entry[4] // 1000,
+                "errors": entry[5],
+                "latency_histogram": list(entry[6]),
+            }
+        stats = {
+            "latency_buckets_us": _LATENCY_BUCKETS_US,
+            "commands": commands,
+            "ready_wait": self._ready_wait.metrics,
+        }
+        stats.update(self._counters)
+        stats["boot_us"] = self._boot_us
+        return stats
+
+    def reset_stats(self):
+        """Clear the statistics collected so far"""
+        if self._stats is not None:
+            self._stats.clear()
+            self._ready_wait.reset_metrics()
+            for name in self._counters:
+                self._counters[name] = 0
 
     @property
     def status(self):
@@ -428,10 +1456,10 @@ class ESP_SPIcontrol:
         (not found), WL_STOPPED, WL_IDLE_STATUS, WL_NO_SSID_AVAIL, WL_SCAN_COMPLETED,
         WL_CONNECTED, WL_CONNECT_FAILED, WL_CONNECTION_LOST, WL_DISCONNECTED,
         WL_AP_LISTENING, WL_AP_CONNECTED, WL_AP_FAILED"""
-        resp = self._send_command_get_response(_GET_CONN_STATUS_CMD)
+        status = self._send_command_get_arena_response(_GET_CONN_STATUS_CMD)
         if self._debug:
-            print("Connection status:", resp[0][0])
-        return resp[0][0]  # one byte response
+            print("Connection status:", status)
+        return status
 
     @property
     def firmware_version(self):
@@ -441,12 +1469,37 @@ class ESP_SPIcontrol:
         resp = self._send_command_get_response(_GET_FW_VERSION_CMD)
         return resp[0].decode("utf-8").replace("\x00", "")
 
+    @property
+    def capabilities(self):
+        """What the firmware on the ESP32 supports, probed the first time it's needed
+        after a reset and kept until the next one. A dict of the "firmware_version"
+        string, the same as a "version" tuple of ints, the set of "commands" it
+        accepts and the largest "max_write_chunk_size" `write_chunk_size` can be set
+        to: as much as fits the firmware's SPI buffer, less once the firmware has
+        answered a chunk with an error"""
+        capabilities = dict(self._capability_map())
+        capabilities["max_write_chunk_size"] = self._max_write_chunk_size
+        return capabilities
+
+    def _capability_map(self):
+        if self._capabilities is None:
+            firmware_version = self.firmware_version
+            version = _parse_version(firmware_version)
+            self._capabilities = {
+                "firmware_version": firmware_version,
+                "version": version,
+                "commands": {
+                    cmd for cmd in _COMMANDS if _COMMAND_VERSIONS.get(cmd, version) <= version
+                },
+            }
+        return self._capabilities
+
     @property
     def MAC_address(self):
         """A bytearray containing the MAC address of the ESP32"""
         if self._debug:
             print("MAC address")
-        resp = self._send_command_get_response(_GET_MACADDR_CMD, [b"\xff"])
+        resp = self._send_command_get_response(_GET_MACADDR_CMD)
         return resp[0]
 
     @property
@@ -472,8 +1525,7 @@ class ESP_SPIcontrol:
         """The results of the latest SSID scan. Returns a list of dictionaries with
         'ssid', 'rssi', 'encryption', bssid, and channel entries, one for each AP found
         """
-        self._send_command(_SCAN_NETWORKS)
-        names = self._wait_response_cmd(_SCAN_NETWORKS)
+        names = self._send_command_get_response(_SCAN_NETWORKS)
         # print("SSID names:", names)
         APs = []
         for i, name in enumerate(names):
@@ -519,7 +1571,6 @@ class ESP_SPIcontrol:
                 self.unpretty_ip(gateway),
                 self.unpretty_ip(mask),
             ],
-            sent_param_len_16=False,
         )
         return resp
 
@@ -604,7 +1655,7 @@ class ESP_SPIcontrol:
     def network_data(self):
         """A dictionary containing current connection details such as the 'ip_addr',
         'netmask' and 'gateway'"""
-        resp = self._send_command_get_response(_GET_IPADDR_CMD, [b"\xff"], reply_params=3)
+        resp = self._send_command_get_response(_GET_IPADDR_CMD)
         return {"ip_addr": resp[0], "netmask": resp[1], "gateway": resp[2]}
 
     @property
@@ -612,13 +1663,59 @@ class ESP_SPIcontrol:
         """Our local IP address"""
         return self.network_data["ip_addr"]
 
+    def resync(self):
+        """Get back in step with the ESP32 after a garbled or missed reply, without a
+        hardware reset if possible: clock out whatever it has queued up, so the next
+        transaction starts on a frame boundary, then check that a status command goes
+        through. Only if that keeps failing is the ESP32 reset, dropping the network
+        connection and every socket. Returns whether it resynced without a reset."""
+        if self._debug:
+            print("Resync ESP32")
+        previous = self._start_operation(self._deadlines["resync"])
+        try:
+            for _ in range(_RESYNC_ATTEMPTS):
+                try:
+                    if self._drain():
+                        self._send_command_get_arena_response(_GET_CONN_STATUS_CMD)
+                        self._count("resyncs")
+                        return True
+                except OSError:  # still out of step, or out of time
+                    pass
+        finally:
+            self._end_operation(previous)
+        self._count("resync_resets")
+        self.reset()
+        return False
+
+    def _drain(self):
+        """Get the ESP32 back to waiting for a command, dropping any reply it has
+        pending, one the driver gave up on for example. The firmware strictly takes
+        turns: a transaction while no reply is pending is taken as a command, even if
+        the driver only reads. So if what was read wasn't a reply, the error reply to
+        that is read out as well. Returns False if the ESP32 doesn't get ready for it,
+        or doesn't answer like NINA-fw"""
+        for _ in range(2):
+            if self._ready.value and not self._ready_wait.wait(
+                self._ready, False, self._wait_timeout(self._select_timeout)
+            ):
+                return False
+            with self._transport as spi:
+                if not self._ready.value and not self._ready_wait.wait(
+                    self._ready, True, self._wait_timeout(self._select_timeout)
+                ):
+                    return False
+                self._read_bytes(spi, self._arena, 0, _ARENA_SIZE)
+            if self._arena[0] in {_START_CMD, _ERR_CMD}:
+                return True
+        return False
+
     @property
     def connected(self):
         """Whether the ESP32 is connected to an access point"""
         try:
             return self.status == WL_CONNECTED
         except OSError:
-            self.reset()
+            self.resync()
             return False
 
     @property
@@ -632,7 +1729,7 @@ class ESP_SPIcontrol:
         try:
             return self.status == WL_AP_LISTENING
         except OSError:
-            self.reset()
+            self.resync()
             return False
 
     def disconnect(self):
@@ -685,11 +1782,16 @@ class ESP_SPIcontrol:
             if stat == WL_CONNECTED:
                 return stat
             time.sleep(0.05)
+        raise self._connect_AP_error(ssid, stat)
+
+    @staticmethod
+    def _connect_AP_error(ssid, stat):
+        """The exception for a connect_AP that ended up in status stat"""
         if stat in {WL_CONNECT_FAILED, WL_CONNECTION_LOST, WL_DISCONNECTED}:
-            raise ConnectionError("Failed to connect to ssid", ssid)
+            return ConnectionError("Failed to connect to ssid", ssid)
         if stat == WL_NO_SSID_AVAIL:
-            raise ConnectionError("No such ssid", ssid)
-        raise OSError(f"Unknown error 0x{stat:02X}")
+            return ConnectionError("No such ssid", ssid)
+        return OSError(f"Unknown error 0x{stat:02X}")
 
     def create_AP(self, ssid, password, channel=1, timeout=10):
         """Create an access point with the given name, password, and channel.
@@ -743,17 +1845,22 @@ class ESP_SPIcontrol:
         octets = [int(x) for x in ip.split(".")]
         return bytes(octets)
 
-    def get_host_by_name(self, hostname):
+    def get_host_by_name(self, hostname, timeout=None):
         """Convert a hostname to a packed 4-byte IP address. Returns
-        a 4 bytearray"""
+        a 4 bytearray. With a timeout, gives up with a TimeoutError after
+        that many seconds"""
         if self._debug:
             print("*** Get host by name")
         if isinstance(hostname, str):
             hostname = bytes(hostname, "utf-8")
-        resp = self._send_command_get_response(_REQ_HOST_BY_NAME_CMD, (hostname,))
-        if resp[0][0] != 1:
-            raise ConnectionError("Failed to request hostname")
-        resp = self._send_command_get_response(_GET_HOST_BY_NAME_CMD)
+        previous = self._start_operation(timeout)
+        try:
+            resp = self._send_command_get_response(_REQ_HOST_BY_NAME_CMD, (hostname,))
+            if resp[0][0] != 1:
+                raise ConnectionError("Failed to request hostname")
+            resp = self._send_command_get_response(_GET_HOST_BY_NAME_CMD)
+        finally:
+            self._end_operation(previous)
         return resp[0]
 
     def ping(self, dest, ttl=250):
@@ -779,34 +1886,38 @@ class ESP_SPIcontrol:
             print(f"Allocated socket #{resp}")
         return resp
 
+    def _new_socket(self, open_socket):
+        """get_socket, then open_socket(socket_num) to put the number to use. The
+        ESP32 hands out the same number until then, so with a lock no other thread's
+        command may come in between. Returns the number"""
+        socket_num = self.get_socket()
+        open_socket(socket_num)
+        return socket_num
+
     def socket_open(self, socket_num, dest, port, conn_mode=TCP_MODE):
         """Open a socket to a destination IP address or hostname
         using the ESP32's internal reference number. By default we use
         'conn_mode' TCP_MODE but can also use UDP_MODE or TLS_MODE
         (dest must be hostname for TLS_MODE!)"""
-        self._socknum_ll[0][0] = socket_num
         if self._debug:
             print("*** Open socket to", dest, port, conn_mode)
+        params = self._socket_open_params(socket_num, dest, port, conn_mode)
+        resp = self._send_command_get_response(_START_CLIENT_TCP_CMD, params)
+        self._socket_opened(socket_num, conn_mode, resp)
+
+    def _socket_open_params(self, socket_num, dest, port, conn_mode):
+        """The parameters of the command that opens a socket, see socket_open"""
         if conn_mode == ESP_SPIcontrol.TLS_MODE and self._tls_socket is not None:
             raise OSError(23, "Only one open SSL connection allowed")
         port_param = struct.pack(">H", port)
         if isinstance(dest, str):  # use the 5 arg version
             dest = bytes(dest, "utf-8")
-            resp = self._send_command_get_response(
-                _START_CLIENT_TCP_CMD,
-                (
-                    dest,
-                    b"\x00\x00\x00\x00",
-                    port_param,
-                    self._socknum_ll[0],
-                    (conn_mode,),
-                ),
-            )
-        else:  # ip address, use 4 arg vesion
-            resp = self._send_command_get_response(
-                _START_CLIENT_TCP_CMD,
-                (dest, port_param, self._socknum_ll[0], (conn_mode,)),
-            )
+            return (dest, b"\x00\x00\x00\x00", port_param, (socket_num,), (conn_mode,))
+        # ip address, use 4 arg vesion
+        return (dest, port_param, (socket_num,), (conn_mode,))
+
+    def _socket_opened(self, socket_num, conn_mode, resp):
+        """Check the response to opening a socket, and keep track of TLS ones"""
         if resp[0][0] != 1:
             raise ConnectionError("Could not connect to remote server")
         if conn_mode == ESP_SPIcontrol.TLS_MODE:
@@ -817,61 +1928,96 @@ class ESP_SPIcontrol:
         SOCKET_SYN_SENT, SOCKET_SYN_RCVD, SOCKET_ESTABLISHED, SOCKET_FIN_WAIT_1,
         SOCKET_FIN_WAIT_2, SOCKET_CLOSE_WAIT, SOCKET_CLOSING, SOCKET_LAST_ACK, or
         SOCKET_TIME_WAIT"""
-        self._socknum_ll[0][0] = socket_num
-        resp = self._send_command_get_response(_GET_CLIENT_STATE_TCP_CMD, self._socknum_ll)
-        return resp[0][0]
+        return self._send_command_get_arena_response(
+            _GET_CLIENT_STATE_TCP_CMD, socket_num=socket_num
+        )
 
     def socket_connected(self, socket_num):
         """Test if a socket is connected to the destination, returns boolean true/false"""
         return self.socket_status(socket_num) == SOCKET_ESTABLISHED
 
-    def socket_write(self, socket_num, buffer, conn_mode=TCP_MODE):
+    def socket_write(self, socket_num, buffer, conn_mode=TCP_MODE, timeout=None):
         """Write the bytearray buffer to a socket.
-        Returns the number of bytes written"""
+        Returns the number of bytes written. With a timeout, gives up with a
+        TimeoutError after that many seconds"""
+        previous = self._start_operation(timeout)
+        try:
+            return self._socket_write(socket_num, buffer, conn_mode)
+        finally:
+            self._end_operation(previous)
+
+    def _socket_write(self, socket_num, buffer, conn_mode):
+        """socket_write, within the current operation's deadline"""
         if self._debug:
             print("Writing:", buffer)
-        self._socknum_ll[0][0] = socket_num
         sent = 0
-        total_chunks = (len(buffer) // 64) + 1
-        send_command = _SEND_DATA_TCP_CMD
+        total_chunks = 0
+        send_command = self._write_command(conn_mode)
+        buffer = memoryview(buffer)
+        socket_param = (socket_num,)
+        offset = 0
+        while True:
+            chunk = buffer[offset : offset + self._write_chunk_size]
+            try:
+                written = self._send_command_get_arena_response(send_command, (socket_param, chunk))
+            except CommandError:
+                # the firmware rejected a chunk this big, retry with a smaller one. Any
+                # other error may come after the data went out, so is not retried
+                if not self._chunk_rejected(len(chunk)):
+                    raise
+                continue
+            sent += written
+            total_chunks += 1
+            offset += len(chunk)
+            if not self._chunk_written(conn_mode, chunk, written) or offset >= len(buffer):
+                break
+
+        finish = self._write_finish(conn_mode, sent, total_chunks, len(buffer))
+        if finish is None:
+            self.socket_close(socket_num)
+            raise ConnectionError(f"Failed to send {len(buffer)} bytes (sent {sent})")
+        self._check_write_finished(
+            finish, self._send_command_get_arena_response(finish, socket_num=socket_num)
+        )
+        return sent
+
+    def _write_command(self, conn_mode):
+        """The command socket_write sends its chunks with"""
         if conn_mode == self.UDP_MODE:  # UDP requires a different command to write
-            send_command = _INSERT_DATABUF_TCP_CMD
-        for chunk in range(total_chunks):
-            resp = self._send_command_get_response(
-                send_command,
-                (
-                    self._socknum_ll[0],
-                    memoryview(buffer)[(chunk * 64) : ((chunk + 1) * 64)],
-                ),
-                sent_param_len_16=True,
-            )
-            sent += resp[0][0]
+            return _INSERT_DATABUF_TCP_CMD
+        return _SEND_DATA_TCP_CMD
 
+    def _chunk_written(self, conn_mode, chunk, written):
+        """Whether socket_write can go on after chunk, given the reply to it: TCP
+        replies with the number of bytes written, UDP with 1 per chunk"""
+        if conn_mode == self.UDP_MODE:
+            return written != 0
+        return written == len(chunk)
+
+    def _write_finish(self, conn_mode, sent, total_chunks, length):
+        """The command socket_write ends with once its chunks are out, None if the
+        socket took less than length bytes and has to be closed instead"""
         if conn_mode == self.UDP_MODE:
             # UDP verifies chunks on write, not bytes
             if sent != total_chunks:
                 raise ConnectionError(f"Failed to write {total_chunks} chunks (sent {sent})")
             # UDP needs to finalize with this command, does the actual sending
-            resp = self._send_command_get_response(_SEND_UDP_DATA_CMD, self._socknum_ll)
-            if resp[0][0] != 1:
+            return _SEND_UDP_DATA_CMD
+        if sent != length:
+            return None
+        return _DATA_SENT_TCP_CMD
+
+    @staticmethod
+    def _check_write_finished(finish, reply):
+        """Check the reply to the command _write_finish gave"""
+        if reply != 1:
+            if finish == _SEND_UDP_DATA_CMD:
                 raise ConnectionError("Failed to send UDP data")
-            return sent
-
-        if sent != len(buffer):
-            self.socket_close(socket_num)
-            raise ConnectionError(f"Failed to send {len(buffer)} bytes (sent {sent})")
-
-        resp = self._send_command_get_response(_DATA_SENT_TCP_CMD, self._socknum_ll)
-        if resp[0][0] != 1:
             raise ConnectionError("Failed to verify data sent")
 
-        return sent
-
     def socket_available(self, socket_num):
         """Determine how many bytes are waiting to be read on the socket"""
-        self._socknum_ll[0][0] = socket_num
-        resp = self._send_command_get_response(_AVAIL_DATA_TCP_CMD, self._socknum_ll)
-        reply = struct.unpack("<H", resp[0])[0]
+        reply = self._send_command_get_arena_response(_AVAIL_DATA_TCP_CMD, socket_num=socket_num)
         if self._debug:
             print(f"ESPSocket: {reply} bytes available")
         return reply
@@ -882,24 +2028,47 @@ class ESP_SPIcontrol:
             print(
                 f"Reading {size} bytes from ESP socket with status {self.socket_status(socket_num)}"
             )
-        self._socknum_ll[0][0] = socket_num
         resp = self._send_command_get_response(
             _GET_DATABUF_TCP_CMD,
-            (self._socknum_ll[0], (size & 0xFF, (size >> 8) & 0xFF)),
-            sent_param_len_16=True,
-            recv_param_len_16=True,
+            ((socket_num,), (size & 0xFF, (size >> 8) & 0xFF)),
         )
         return bytes(resp[0])
 
-    def socket_connect(self, socket_num, dest, port, conn_mode=TCP_MODE):
+    def socket_readinto(self, socket_num, buffer):
+        """Read up to len(buffer) bytes from the socket number directly into buffer,
+        which may be a bytearray or a memoryview. Returns the number of bytes read"""
+        size = min(len(buffer), 0xFFFF)
+        if self._debug:
+            print(f"Reading up to {size} bytes from ESP socket #{socket_num}")
+        return self._send_command_get_response_into(
+            _GET_DATABUF_TCP_CMD,
+            ((socket_num,), (size & 0xFF, (size >> 8) & 0xFF)),
+            buffer,
+        )
+
+    def socket_connect(self, socket_num, dest, port, conn_mode=TCP_MODE, timeout=None):
         """Open and verify we connected a socket to a destination IP address or hostname
         using the ESP32's internal reference number. By default we use
         'conn_mode' TCP_MODE but can also use UDP_MODE or TLS_MODE (dest must
-        be hostname for TLS_MODE!)"""
+        be hostname for TLS_MODE!). With a timeout, gives up with a TimeoutError
+        after that many seconds"""
+        previous = self._start_operation(timeout)
+        try:
+            return self._socket_connect(socket_num, dest, port, conn_mode)
+        finally:
+            self._end_operation(previous)
+
+    def _socket_connect(self, socket_num, dest, port, conn_mode):
+        """socket_connect, within the current operation's deadline"""
         if self._debug:
             print("*** Socket connect mode", conn_mode)
 
         self.socket_open(socket_num, dest, port, conn_mode=conn_mode)
+        return self._established(socket_num, port, conn_mode)
+
+    def _established(self, socket_num, port, conn_mode):
+        """Wait for a socket that was just opened to connect, within the current
+        operation's deadline"""
         if conn_mode == self.UDP_MODE:
             # UDP doesn't actually establish a connection
             # but the socket for writing is created via start_server
@@ -910,6 +2079,7 @@ class ESP_SPIcontrol:
         while (time.monotonic() - times) < 3:  # wait 3 seconds
             if self.socket_connected(socket_num):
                 return True
+            self._check_deadline()
             time.sleep(0.01)
         raise TimeoutError("Failed to establish connection")
 
@@ -917,11 +2087,14 @@ class ESP_SPIcontrol:
         """Close a socket using the ESP32's internal reference number"""
         if self._debug:
             print(f"*** Closing socket #{socket_num}")
-        self._socknum_ll[0][0] = socket_num
         try:
-            self._send_command_get_response(_STOP_CLIENT_TCP_CMD, self._socknum_ll)
+            self._send_command_get_response(_STOP_CLIENT_TCP_CMD, socket_num=socket_num)
         except OSError:
             pass
+        self._socket_closed(socket_num)
+
+    def _socket_closed(self, socket_num):
+        """Forget a socket that was closed"""
         if socket_num == self._tls_socket:
             self._tls_socket = None
 
@@ -929,27 +2102,28 @@ class ESP_SPIcontrol:
         """Opens a server on the specified port, using the ESP32's internal reference number"""
         if self._debug:
             print("*** starting server")
-        self._socknum_ll[0][0] = socket_num
-        params = [struct.pack(">H", port), self._socknum_ll[0], (conn_mode,)]
-        if ip:
-            params.insert(0, ip)
-        resp = self._send_command_get_response(_START_SERVER_TCP_CMD, params)
+        resp = self._send_command_get_response(
+            _START_SERVER_TCP_CMD, self._start_server_params(port, socket_num, conn_mode, ip)
+        )
 
         if resp[0][0] != 1:
             raise OSError("Could not start server")
 
+    @staticmethod
+    def _start_server_params(port, socket_num, conn_mode, ip):
+        """The parameters of the command that starts a server, see start_server"""
+        params = [struct.pack(">H", port), (socket_num,), (conn_mode,)]
+        if ip:
+            params.insert(0, ip)
+        return params
+
     def server_state(self, socket_num):
         """Get the state of the ESP32's internal reference server socket number"""
-        self._socknum_ll[0][0] = socket_num
-        resp = self._send_command_get_response(_GET_STATE_TCP_CMD, self._socknum_ll)
-        return resp[0][0]
+        return self._send_command_get_arena_response(_GET_STATE_TCP_CMD, socket_num=socket_num)
 
     def get_remote_data(self, socket_num):
         """Get the IP address and port of the remote host"""
-        self._socknum_ll[0][0] = socket_num
-        resp = self._send_command_get_response(
-            _GET_REMOTE_DATA_CMD, self._socknum_ll, reply_params=2
-        )
+        resp = self._send_command_get_response(_GET_REMOTE_DATA_CMD, socket_num=socket_num)
         return {"ip_addr": resp[0], "port": struct.unpack("<H", resp[1])[0]}
 
     def set_esp_debug(self, enabled):
@@ -1002,8 +2176,8 @@ class ESP_SPIcontrol:
         :param int pin: ESP32 GPIO pin to read from.
         """
         # Verify nina-fw => 1.5.0
-        fw_semver_maj = self.firmware_version[2]
-        assert int(fw_semver_maj) >= 5, "Please update nina-fw to 1.5.0 or above."
+        supported = self._capability_map()["commands"]
+        assert _SET_DIGITAL_READ_CMD in supported, "Please update nina-fw to 1.5.0 or above."
 
         resp = self._send_command_get_response(_SET_DIGITAL_READ_CMD, ((pin,),))[0]
         if resp[0] == 0:
@@ -1019,8 +2193,8 @@ class ESP_SPIcontrol:
         :param int atten: attenuation constant
         """
         # Verify nina-fw => 1.5.0
-        fw_semver_maj = self.firmware_version[2]
-        assert int(fw_semver_maj) >= 5, "Please update nina-fw to 1.5.0 or above."
+        supported = self._capability_map()["commands"]
+        assert _SET_ANALOG_READ_CMD in supported, "Please update nina-fw to 1.5.0 or above."
 
         resp = self._send_command_get_response(_SET_ANALOG_READ_CMD, ((pin,), (atten,)))
         resp_analog = struct.unpack("<i", resp[0])
@@ -32,6 +32,26 @@ from adafruit_esp32spi import adafruit_esp32spi as esp32spi
 
 _global_socketpool = {}
 
+# socket states in which no more data is coming
+_CLOSED_STATES = {
+    esp32spi.SOCKET_CLOSED,
+    esp32spi.SOCKET_FIN_WAIT_1,
+    esp32spi.SOCKET_FIN_WAIT_2,
+    esp32spi.SOCKET_CLOSE_WAIT,
+    esp32spi.SOCKET_CLOSING,
+    esp32spi.SOCKET_LAST_ACK,
+    esp32spi.SOCKET_TIME_WAIT,
+}
+# select() and a waiting recv_into sleep this long after the first poll that finds
+# nothing, doubling each time up to their ceiling
+_MIN_POLL_INTERVAL = 0.001
+
+
+def _next_poll_interval(interval, ceiling):
+    """How long to sleep before the next poll of an idle socket, after sleeping
+    interval seconds (0 right after data came in) before the last one"""
+    return min(max(interval * 2, _MIN_POLL_INTERVAL), ceiling)
+
 
 class SocketPool:
     """ESP32SPI SocketPool library"""
@@ -74,6 +94,56 @@ class SocketPool:
         """Create a new socket and return it"""
         return Socket(self, family, type, proto, fileno)
 
+    def select(self, rlist, wlist=(), timeout=None, *, max_interval=0.05):
+        """Wait until some of the sockets are ready, checking all of them in one sweep
+        at a time and sleeping between sweeps that find nothing, for longer each time
+        up to max_interval seconds. Returns three sets: the sockets of rlist that can
+        be read from (or accepted on, for listening sockets), those of wlist that are
+        connected and can be sent on, and those of either that have been closed by the
+        remote end and have no more data to read. ``timeout`` is in seconds, ``0`` just
+        checks once and ``None`` waits until something is ready."""
+        start = time.monotonic()
+        interval = _MIN_POLL_INTERVAL
+        while True:
+            readable, writable, closed = self._sweep(rlist, wlist)
+            if readable or writable or closed:
+                break
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                interval = min(interval, remaining)
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+        return readable, writable, closed
+
+    @staticmethod
+    def _sweep(rlist, wlist):
+        """One pass over the sockets for select, at most two commands per socket"""
+        rset = set(rlist)
+        wset = set(wlist)
+        readable = set()
+        writable = set()
+        closed = set()
+        for sock in rset | wset:
+            if sock in rset and sock._readable():
+                readable.add(sock)
+                if sock not in wset:
+                    continue
+            if sock._listening:
+                continue
+            if sock._type == SocketPool.SOCK_DGRAM:
+                if sock in wset:
+                    writable.add(sock)
+                continue
+            status = sock._status()
+            if status == esp32spi.SOCKET_ESTABLISHED:
+                if sock in wset:
+                    writable.add(sock)
+            elif status in _CLOSED_STATES and sock not in readable:
+                closed.add(sock)
+        return readable, writable, closed
+
 
 class Socket:
     """A simplified implementation of the Python 'socket' class, for connecting
@@ -83,8 +153,22 @@ class Socket:
     :param SocketPool socket_pool: The underlying socket pool.
     :param Optional[int] socknum: Allows wrapping a Socket instance around a socket
                               number returned by the nina firmware. Used internally.
+                              Otherwise the socket gets a number from the ESP32
+                              when it connects or listens.
     """
 
+    max_poll_interval = 0.01
+    """The longest a blocking `recv_into` sleeps between checks for data. While data
+    keeps coming it checks again right away, once it stops the sleeps double from
+    1ms up to this many seconds"""
+
+    optimistic_recv = True
+    """Whether `recv_into` reads straight away, taking the length of what came back
+    as what was available, instead of asking how much is available before each
+    read. That is one SPI command per chunk instead of two, availability is only
+    polled while the socket is idle. The firmware answers a read that finds nothing
+    with an error, which counts as an idle poll"""
+
     def __init__(
         self,
         socket_pool: SocketPool,
@@ -99,9 +183,14 @@ class Socket:
         self._socket_pool = socket_pool
         self._interface = self._socket_pool._interface
         self._type = type
-        self._buffer = b""
-        self._socknum = socknum if socknum is not None else self._interface.get_socket()
+        # data read ahead by readline and peek: _buffer[_buffer_start:_buffer_end]
+        self._buffer = None  # allocated on first use
+        self._buffer_start = 0
+        self._buffer_end = 0
+        self._socknum = socknum if socknum is not None else SocketPool.NO_SOCKET_AVAIL
         self._bound = ()
+        self._listening = False
+        self._client_socknum = SocketPool.NO_SOCKET_AVAIL  # accepted by select()
         self.settimeout(None)
 
     def __enter__(self):
@@ -109,7 +198,7 @@ class Socket:
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         self.close()
-        while self._interface.socket_status(self._socknum) != esp32spi.SOCKET_CLOSED:
+        while self._status() != esp32spi.SOCKET_CLOSED:
             pass
 
     def connect(self, address, conntype=None):
@@ -123,9 +212,21 @@ class Socket:
                 if self._type == SocketPool.SOCK_DGRAM
                 else self._interface.TCP_MODE
             )
-        if not self._interface.socket_connect(self._socknum, host, port, conn_mode=conntype):
+        interface = self._interface
+        previous = interface._start_operation(self._operation_timeout())
+        try:
+            if self._socknum == SocketPool.NO_SOCKET_AVAIL:
+                self._socknum = interface._new_socket(
+                    lambda socket_num: interface.socket_open(socket_num, host, port, conntype)
+                )
+            else:
+                interface.socket_open(self._socknum, host, port, conntype)
+            connected = interface._established(self._socknum, port, conntype)
+        finally:
+            interface._end_operation(previous)
+        if not connected:
             raise ConnectionError("Failed to connect to host", host)
-        self._buffer = b""
+        self._buffer_start = self._buffer_end = 0
 
     def send(self, data):
         """Send some data to the socket."""
@@ -133,7 +234,9 @@ class Socket:
             conntype = self._interface.UDP_MODE
         else:
             conntype = self._interface.TCP_MODE
-        sent = self._interface.socket_write(self._socknum, data, conn_mode=conntype)
+        sent = self._interface.socket_write(
+            self._socknum, data, conn_mode=conntype, timeout=self._operation_timeout()
+        )
         gc.collect()
         return sent
 
@@ -163,29 +266,51 @@ class Socket:
         if not 0 <= nbytes <= len(buffer):
             raise ValueError("nbytes must be 0 to len(buffer)")
 
-        last_read_time = time.monotonic_ns()
         num_to_read = len(buffer) if nbytes == 0 else nbytes
-        num_read = 0
+        # whatever readline or peek read ahead comes first
+        num_read = self._take(buffer, num_to_read)
+        # with a timeout, no single command may take longer than that either
+        previous = self._interface._start_operation(self._operation_timeout())
+        try:
+            return self._recv_into(buffer, num_read, num_to_read - num_read, previous)
+        except TimeoutError:  # the timeout ran out before the next poll could go out
+            raise OSError(errno.ETIMEDOUT)
+        finally:
+            self._interface._end_operation(previous)
+
+    def _recv_into(self, buffer, num_read, num_to_read, previous):
+        """recv_into, from the socket into buffer after the num_read bytes already
+        there, within an operation deadline started on top of previous"""
+        last_read_time = time.monotonic_ns()
+        interval = 0  # sleep before the next poll, 0 while data is flowing
+        count = self._interface._count
         while num_to_read > 0:
-            # we might have read socket data into the self._buffer with:
-            # adafruit_wsgi.esp32spi_wsgiserver: socket_readline
-            if len(self._buffer) > 0:
-                bytes_to_read = min(num_to_read, len(self._buffer))
-                buffer[num_read : num_read + bytes_to_read] = self._buffer[:bytes_to_read]
-                num_read += bytes_to_read
-                num_to_read -= bytes_to_read
-                self._buffer = self._buffer[bytes_to_read:]
-                # explicitly recheck num_to_read to avoid extra checks
-                continue
-
-            num_avail = self._available()
+            count("recv_polls")
+            optimistic = self.optimistic_recv and not interval
+            if optimistic:
+                # just read, the reply says how much there was
+                num_avail = SocketPool.MAX_PACKET
+            else:
+                num_avail = self._available()
             if num_avail > 0:
+                bytes_read = self._read_into(
+                    memoryview(buffer)[num_read : num_read + min(num_to_read, num_avail)],
+                    optimistic,
+                )
+            else:
+                bytes_read = 0
+            if bytes_read > 0:
+                interval = 0
                 last_read_time = time.monotonic_ns()
-                bytes_read = self._interface.socket_read(self._socknum, min(num_to_read, num_avail))
-                buffer[num_read : num_read + len(bytes_read)] = bytes_read
-                num_read += len(bytes_read)
-                num_to_read -= len(bytes_read)
-            elif num_read > 0:
+                if self._timeout > 0:  # data came in, the deadline starts over
+                    self._interface._end_operation(previous)
+                    self._interface._start_operation(self._timeout / 1000)
+                num_read += bytes_read
+                num_to_read -= bytes_read
+                if self._timeout == 0:  # if in non-blocking mode, stop now.
+                    break
+                continue
+            if num_read > 0:
                 # We got a message, but there are no more bytes to read, so we can stop.
                 break
             # No bytes yet, or more bytes requested.
@@ -197,8 +322,106 @@ class Socket:
             delta = (time.monotonic_ns() - last_read_time) // 1_000_000
             if self._timeout > 0 and delta > self._timeout:
                 raise OSError(errno.ETIMEDOUT)
+
+            # nothing yet, back off so an idle connection doesn't hog the bus
+            count("recv_idle_polls")
+            if interval:
+                if self._timeout > 0:
+                    interval = min(interval, (self._timeout - delta + 1) / 1000)
+                time.sleep(interval)
+            interval = _next_poll_interval(interval, self.max_poll_interval)
         return num_read
 
+    def _read_into(self, buffer, optimistic):
+        """socket_readinto, for an optimistic read too: the firmware answers a read of
+        a socket with nothing buffered with an error, which just means 0 bytes"""
+        if not optimistic:
+            return self._interface.socket_readinto(self._socknum, buffer)
+        try:
+            return self._interface.socket_readinto(self._socknum, buffer)
+        except esp32spi.CommandError:
+            return 0
+
+    def _take(self, buffer, nbytes):
+        """Move up to nbytes of read ahead data to the start of buffer"""
+        size = min(nbytes, self._buffer_end - self._buffer_start)
+        if size:
+            start = self._buffer_start
+            buffer[:size] = memoryview(self._buffer)[start : start + size]
+            self._buffer_start = start + size
+        return size
+
+    def _fill(self):
+        """Read more data onto the end of the read ahead buffer, waiting for it as
+        recv_into would. Returns how much was added, 0 if the buffer is full"""
+        if self._buffer is None:
+            self._buffer = bytearray(SocketPool.MAX_PACKET)
+        start = self._buffer_start
+        end = self._buffer_end
+        if start == end:
+            end = 0
+        elif start:  # move what's left to the front, to make room behind it
+            self._buffer[: end - start] = self._buffer[start:end]
+            end -= start
+        self._buffer_start = 0
+        self._buffer_end = end
+        if end == len(self._buffer):
+            return 0
+        previous = self._interface._start_operation(self._operation_timeout())
+        try:
+            added = self._recv_into(
+                memoryview(self._buffer)[end:], 0, len(self._buffer) - end, previous
+            )
+        except TimeoutError:  # the timeout ran out before the next poll could go out
+            raise OSError(errno.ETIMEDOUT)
+        finally:
+            self._interface._end_operation(previous)
+        self._buffer_end = end + added
+        return added
+
+    def peek(self, nbytes: int = 0) -> bytes:
+        """Return the data the next recv would, without consuming it. Waits for data
+        as recv does if none has been read ahead yet.
+
+        :param int nbytes: maximum number of bytes to return; if 0, everything
+            read ahead so far
+        """
+        if self._buffer_end == self._buffer_start:
+            self._fill()
+        if self._buffer is None:
+            return b""
+        end = self._buffer_end
+        if nbytes:
+            end = min(end, self._buffer_start + nbytes)
+        return bytes(memoryview(self._buffer)[self._buffer_start : end])
+
+    def readline(self) -> bytes:
+        """Read one line, up to and including the ``\\n``. The data is read ahead
+        into a buffer of MAX_PACKET bytes and scanned there, a longer line comes back
+        in pieces of that size. Without a newline, returns what arrived if no more
+        comes (non-blocking sockets), and waits as recv does otherwise."""
+        scanned = 0  # bytes after _buffer_start known not to hold a newline
+        while True:
+            buffer = self._buffer
+            start = self._buffer_start
+            end = self._buffer_end
+            for index in range(start + scanned, end):
+                if buffer[index] == 0x0A:
+                    end = index + 1
+                    break
+            else:
+                scanned = end - start
+                if self._fill():
+                    continue
+                # full, or nothing more came
+                start = self._buffer_start
+                end = self._buffer_end
+            break
+        if start == end:
+            return b""
+        self._buffer_start = end
+        return bytes(memoryview(self._buffer)[start:end])
+
     def settimeout(self, value):
         """Set the read timeout for sockets in seconds.
         ``0`` means non-blocking. ``None`` means block indefinitely.
@@ -211,12 +434,33 @@ class Socket:
             # internally in milliseconds as an int
             self._timeout = int(value * 1000)
 
+    def _operation_timeout(self):
+        """The timeout in seconds for operations on the ESP32, None for no limit"""
+        if self._timeout > 0:
+            return self._timeout / 1000
+        return None
+
     def _available(self):
         """Returns how many bytes of data are available to be read (up to the MAX_PACKET length)"""
         if self._socknum != SocketPool.NO_SOCKET_AVAIL:
             return min(self._interface.socket_available(self._socknum), SocketPool.MAX_PACKET)
         return 0
 
+    def _readable(self):
+        """Whether recv_into, or accept on a listening socket, has something to get"""
+        if self._listening:
+            # the ESP32 hands over a waiting connection when asked, keep it for accept
+            if self._client_socknum == SocketPool.NO_SOCKET_AVAIL:
+                self._client_socknum = self._interface.socket_available(self._socknum)
+            return self._client_socknum != SocketPool.NO_SOCKET_AVAIL
+        return self._buffer_end > self._buffer_start or self._available() > 0
+
+    def _status(self):
+        """The state of the connection, SOCKET_CLOSED for a socket given up on"""
+        if self._socknum == SocketPool.NO_SOCKET_AVAIL:
+            return esp32spi.SOCKET_CLOSED
+        return self._interface.socket_status(self._socknum)
+
     def _connected(self):
         """Whether or not we are connected to the socket"""
         if self._socknum == SocketPool.NO_SOCKET_AVAIL:
@@ -241,14 +485,18 @@ class Socket:
 
     def close(self):
         """Close the socket, after reading whatever remains"""
-        self._interface.socket_close(self._socknum)
+        if self._socknum != SocketPool.NO_SOCKET_AVAIL:
+            self._interface.socket_close(self._socknum)
 
     def accept(self):
         """Accept a connection on a listening socket of type SOCK_STREAM,
         creating a new socket of type SOCK_STREAM. Returns a tuple of
         (new_socket, remote_address)
         """
-        client_sock_num = self._interface.socket_available(self._socknum)
+        client_sock_num = self._client_socknum
+        if client_sock_num == SocketPool.NO_SOCKET_AVAIL:
+            client_sock_num = self._interface.socket_available(self._socknum)
+        self._client_socknum = SocketPool.NO_SOCKET_AVAIL
         if client_sock_num != SocketPool.NO_SOCKET_AVAIL:
             sock = Socket(self._socket_pool, socknum=client_sock_num)
             # get remote information (addr and port)
@@ -270,7 +518,13 @@ class Socket:
         if not self._bound:
             self._bound = (self._interface.ip_address, 80)
         port = self._bound[1]
-        self._interface.start_server(port, self._socknum)
+        if self._socknum == SocketPool.NO_SOCKET_AVAIL:
+            self._socknum = self._interface._new_socket(
+                lambda socket_num: self._interface.start_server(port, socket_num)
+            )
+        else:
+            self._interface.start_server(port, self._socknum)
+        self._listening = True
 
     def setblocking(self, flag: bool):
         """Set the blocking behaviour of this socket.
@@ -93,8 +93,14 @@ class WiFiManager:
 
     def connect(self):
         """
-        Attempt to connect to WiFi using the current settings
-        """
+        Attempt to connect to WiFi using the current settings. If the ESP32 was
+        attached to while still connected to one of the access points, that
+        connection is kept as it is.
+        """
+        if self._reusable_connection():
+            if self.debug:
+                print("Reusing the connection to", self.esp.ap_info.ssid)
+            return
         if self.debug:
             if self.esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
                 print("ESP32 found and in idle mode")
@@ -109,6 +115,15 @@ class WiFiManager:
         else:
             raise TypeError("Invalid WiFi connection type specified")
 
+    def _reusable_connection(self):
+        if not self.esp.attached or not self.esp.is_connected:
+            return False
+        ssids = self.ssid if isinstance(self.ssid, (tuple, list)) else (self.ssid,)
+        try:
+            return self.esp.ap_info.ssid in ssids
+        except OSError:
+            return False
+
     def _get_next_ap(self):
         if isinstance(self.ssid, (tuple, list)) and isinstance(self.password, (tuple, list)):
             if not self.ssid or not self.password:
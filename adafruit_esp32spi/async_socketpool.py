@@ -0,0 +1,512 @@
+# SPDX-FileCopyrightText: Copyright (c) 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`async_socketpool`
+================================================================================
+
+asyncio versions of the ESP32SPI commands that wait on the ESP32, and of the socket
+interface built on them, so other tasks keep running while the ESP32 is busy.
+
+`AsyncESP` runs commands on an ``ESP_SPIcontrol`` one at a time, but instead of
+spinning on the ready pin and sleeping between status polls it yields to the event
+loop. `AsyncSocketPool` and `AsyncSocket` mirror ``SocketPool`` and ``Socket`` with
+``async`` methods.
+
+.. code:: python
+
+    import asyncio
+    from adafruit_esp32spi.async_socketpool import AsyncESP, AsyncSocketPool
+
+    async def main():
+        radio = AsyncESP(esp)
+        await radio.connect_AP(ssid, password)
+        pool = AsyncSocketPool(radio)
+        host = await pool.getaddrinfo("example.com", 80)
+        sock = pool.socket()
+        await sock.connect(host[0][4])
+        await sock.send(b"GET / HTTP/1.0\\r\\nHost: example.com\\r\\n\\r\\n")
+        ...
+
+While an `AsyncESP` is in use, every command from the same thread has to go
+through it: a command sent directly on the ``ESP_SPIcontrol`` could land between
+another task's request and its reply. Other threads can use the
+``ESP_SPIcontrol`` if it was created with a ``lock``, which `AsyncESP` holds for
+each command without blocking the event loop while it waits for it.
+"""
+
+import asyncio
+import errno
+import time
+
+from micropython import const
+
+from adafruit_esp32spi import adafruit_esp32spi as esp32spi
+from adafruit_esp32spi.adafruit_esp32spi_socketpool import _next_poll_interval
+
+__version__ = "0.0.0+auto.0"
+__repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_ESP32SPI.git"
+
+# socket states that mean a connection is over, or never got going
+_DISCONNECTED = {
+    esp32spi.SOCKET_LISTEN,
+    esp32spi.SOCKET_CLOSED,
+    esp32spi.SOCKET_FIN_WAIT_1,
+    esp32spi.SOCKET_FIN_WAIT_2,
+    esp32spi.SOCKET_TIME_WAIT,
+    esp32spi.SOCKET_SYN_SENT,
+    esp32spi.SOCKET_SYN_RCVD,
+    esp32spi.SOCKET_CLOSE_WAIT,
+}
+
+# longest the event loop is held up at a time waiting for the lock of the driver
+_LOCK_WAIT = 0.001
+# how the ready line is polled when the driver's ready_wait has no backoff of its own
+_BACKOFF = esp32spi.BackoffWait()
+
+
+class AsyncESP:
+    """Runs the commands of an ``ESP_SPIcontrol`` from asyncio tasks. Commands go
+    over the bus one whole request and reply at a time, other tasks run while the
+    ESP32 works on one.
+
+    :param ESP_SPIcontrol esp: The driver to send the commands through
+    """
+
+    TCP_MODE = const(0)
+    UDP_MODE = const(1)
+    TLS_MODE = const(2)
+
+    def __init__(self, esp):
+        self.esp = esp
+        self._lock = asyncio.Lock()
+        # held from get_socket until the socket is opened, as the ESP32 hands out the
+        # same number until then
+        self._allocating = asyncio.Lock()
+
+    def _deadline(self, cmd):
+        """When the ESP32 has to be ready for cmd by, in monotonic_ns"""
+        return time.monotonic_ns() + int(self.esp._timeouts[cmd] * 1e9)
+
+    async def _wait_for_ready(self, deadline):
+        """Wait until the ready pin goes low, until deadline at most. Other tasks get
+        one turn before the first check, then the sleeps between checks grow as
+        those of the driver's ``ready_wait`` do, if it is a ``BackoffWait``, or of a
+        default one"""
+        ready = self.esp._ready
+        if not ready.value:
+            return
+        backoff = self.esp._ready_wait
+        if not isinstance(backoff, esp32spi.BackoffWait):
+            backoff = _BACKOFF
+        await asyncio.sleep(0)
+        sleep = backoff.min_sleep
+        while ready.value:
+            remaining = deadline - time.monotonic_ns()
+            if remaining <= 0:
+                raise TimeoutError("ESP32 not responding")
+            await asyncio.sleep(min(sleep, remaining / 1e9))
+            sleep = min(sleep * 2, backoff.max_sleep)
+
+    async def _wait_for_reply(self, deadline):
+        """_wait_for_ready, once a command has gone out. Its reply has to be read
+        before the next command, so a cancel only takes effect after that: returns
+        the CancelledError to raise then, None if there was none"""
+        cancelled = None
+        while True:
+            try:
+                await self._wait_for_ready(deadline)
+                return cancelled
+            except asyncio.CancelledError as error:
+                cancelled = error
+
+    async def _lock_esp(self):
+        """Take the lock of the driver, if it has one, letting other tasks run every
+        millisecond while another thread holds it. Waiting on the lock, rather than
+        checking it between tasks, keeps a busy thread from taking it every time"""
+        esp = self.esp
+        if esp._lock is None:
+            return
+        start = time.monotonic_ns()
+        while not esp._lock.acquire(True, _LOCK_WAIT):
+            await asyncio.sleep(0)
+        esp._counters["lock_waits"] += 1
+        esp._counters["lock_wait_us"] += (time.monotonic_ns() - start) // 1000
+
+    def _unlock_esp(self):
+        """Release what _lock_esp took"""
+        if self.esp._lock is not None:
+            self.esp._lock.release()
+
+    async def _exchange(self, cmd, params, socket_num, receive, *args):
+        """Send cmd and return receive(cmd, *args), the parsed reply, waiting for the
+        ESP32 without blocking the event loop. Holds the bus for the whole exchange"""
+        async with self._lock:
+            await self._lock_esp()
+            try:
+                return await self._locked_exchange(cmd, params, socket_num, receive, args)
+            finally:
+                self._unlock_esp()
+
+    async def _locked_exchange(self, cmd, params, socket_num, receive, args):
+        """_exchange, with the bus held"""
+        esp = self.esp
+        if esp._stats is not None:
+            esp._stats_ready_ns = esp._stats_sent = esp._stats_received = 0
+            start = time.monotonic_ns()
+        try:
+            await self._wait_for_ready(self._deadline(cmd))
+            esp._send_command(cmd, params, socket_num=socket_num)
+            cancelled = await self._wait_for_reply(self._deadline(cmd))
+            result = receive(cmd, *args)
+        except Exception:
+            if esp._stats is not None:
+                esp._add_stats(cmd, time.monotonic_ns() - start, error=True)
+            raise
+        if esp._stats is not None:
+            esp._add_stats(cmd, time.monotonic_ns() - start)
+        if cancelled is not None:
+            raise cancelled
+        return result
+
+    async def _command(self, cmd, params=None, *, socket_num=None):
+        """The async _send_command_get_response"""
+        return await self._exchange(cmd, params, socket_num, self.esp._receive)
+
+    async def _arena_command(self, cmd, params=None, *, socket_num=None):
+        """The async _send_command_get_arena_response"""
+        return await self._exchange(cmd, params, socket_num, self.esp._receive_arena)
+
+    async def status(self):
+        """The status of the ESP32 WiFi core, see ``ESP_SPIcontrol.status``"""
+        return await self._arena_command(esp32spi._GET_CONN_STATUS_CMD)
+
+    async def connect_AP(self, ssid, password, timeout_s=10):
+        """Connect to an access point with given name and password, see
+        ``ESP_SPIcontrol.connect_AP``. Other tasks run while the ESP32 connects."""
+        if isinstance(ssid, str):
+            ssid = bytes(ssid, "utf-8")
+        if password:
+            if isinstance(password, str):
+                password = bytes(password, "utf-8")
+            resp = await self._command(esp32spi._SET_PASSPHRASE_CMD, (ssid, password))
+            if resp[0][0] != 1:
+                raise OSError("Failed to set passphrase")
+        else:
+            resp = await self._command(esp32spi._SET_NET_CMD, (ssid,))
+            if resp[0][0] != 1:
+                raise OSError("Failed to set network")
+        times = time.monotonic()
+        while (time.monotonic() - times) < timeout_s:  # wait up until timeout
+            stat = await self.status()
+            if stat == esp32spi.WL_CONNECTED:
+                return stat
+            await asyncio.sleep(0.05)
+        raise self.esp._connect_AP_error(ssid, stat)
+
+    async def get_host_by_name(self, hostname):
+        """Convert a hostname to a packed 4-byte IP address, see
+        ``ESP_SPIcontrol.get_host_by_name``"""
+        if isinstance(hostname, str):
+            hostname = bytes(hostname, "utf-8")
+        resp = await self._command(esp32spi._REQ_HOST_BY_NAME_CMD, (hostname,))
+        if resp[0][0] != 1:
+            raise ConnectionError("Failed to request hostname")
+        resp = await self._command(esp32spi._GET_HOST_BY_NAME_CMD)
+        return resp[0]
+
+    async def get_socket(self):
+        """Request a socket number from the ESP32, see ``ESP_SPIcontrol.get_socket``.
+        It hands out the same number until a socket is opened with it, `AsyncSocket`
+        takes care of that when several tasks connect at once"""
+        resp = await self._command(esp32spi._GET_SOCKET_CMD)
+        if resp[0][0] == 255:
+            raise OSError(23)  # ENFILE - File table overflow
+        return resp[0][0]
+
+    async def socket_status(self, socket_num):
+        """Get the socket connection status, see ``ESP_SPIcontrol.socket_status``"""
+        return await self._arena_command(esp32spi._GET_CLIENT_STATE_TCP_CMD, socket_num=socket_num)
+
+    async def socket_open(self, socket_num, dest, port, conn_mode=TCP_MODE):
+        """Open a socket to a destination IP address or hostname, see
+        ``ESP_SPIcontrol.socket_open``"""
+        esp = self.esp
+        resp = await self._command(
+            esp32spi._START_CLIENT_TCP_CMD,
+            esp._socket_open_params(socket_num, dest, port, conn_mode),
+        )
+        esp._socket_opened(socket_num, conn_mode, resp)
+
+    async def socket_connect(self, socket_num, dest, port, conn_mode=TCP_MODE):
+        """Open a socket and wait, without blocking, for it to connect. See
+        ``ESP_SPIcontrol.socket_connect``"""
+        await self.socket_open(socket_num, dest, port, conn_mode)
+        return await self._established(socket_num, port, conn_mode)
+
+    async def _established(self, socket_num, port, conn_mode):
+        """Wait for a socket that was just opened to connect"""
+        if conn_mode == self.UDP_MODE:
+            # UDP doesn't actually establish a connection
+            # but the socket for writing is created via start_server
+            resp = await self._command(
+                esp32spi._START_SERVER_TCP_CMD,
+                self.esp._start_server_params(port, socket_num, conn_mode, None),
+            )
+            if resp[0][0] != 1:
+                raise OSError("Could not start server")
+            return True
+
+        times = time.monotonic()
+        while (time.monotonic() - times) < 3:  # wait 3 seconds
+            if await self.socket_status(socket_num) == esp32spi.SOCKET_ESTABLISHED:
+                return True
+            await asyncio.sleep(0.01)
+        raise TimeoutError("Failed to establish connection")
+
+    async def socket_write(self, socket_num, buffer, conn_mode=TCP_MODE):
+        """Write the bytearray buffer to a socket, see ``ESP_SPIcontrol.socket_write``.
+        Returns the number of bytes written"""
+        esp = self.esp
+        sent = 0
+        total_chunks = 0
+        send_command = esp._write_command(conn_mode)
+        buffer = memoryview(buffer)
+        socket_param = (socket_num,)
+        offset = 0
+        while True:
+            chunk = buffer[offset : offset + esp._write_chunk_size]
+            try:
+                written = await self._arena_command(send_command, (socket_param, chunk))
+            except esp32spi.CommandError:
+                # the firmware rejected a chunk this big, retry with a smaller one
+                if not esp._chunk_rejected(len(chunk)):
+                    raise
+                continue
+            sent += written
+            total_chunks += 1
+            offset += len(chunk)
+            if not esp._chunk_written(conn_mode, chunk, written) or offset >= len(buffer):
+                break
+
+        finish = esp._write_finish(conn_mode, sent, total_chunks, len(buffer))
+        if finish is None:
+            await self.socket_close(socket_num)
+            raise ConnectionError(f"Failed to send {len(buffer)} bytes (sent {sent})")
+        esp._check_write_finished(finish, await self._arena_command(finish, socket_num=socket_num))
+        return sent
+
+    async def socket_available(self, socket_num):
+        """Determine how many bytes are waiting to be read on the socket"""
+        return await self._arena_command(esp32spi._AVAIL_DATA_TCP_CMD, socket_num=socket_num)
+
+    async def socket_readinto(self, socket_num, buffer):
+        """Read up to len(buffer) bytes from the socket number directly into buffer,
+        see ``ESP_SPIcontrol.socket_readinto``. Returns the number of bytes read"""
+        size = min(len(buffer), 0xFFFF)
+        return await self._exchange(
+            esp32spi._GET_DATABUF_TCP_CMD,
+            ((socket_num,), (size & 0xFF, (size >> 8) & 0xFF)),
+            None,
+            self.esp._receive_into,
+            buffer,
+        )
+
+    async def socket_close(self, socket_num):
+        """Close a socket using the ESP32's internal reference number"""
+        try:
+            await self._command(esp32spi._STOP_CLIENT_TCP_CMD, socket_num=socket_num)
+        except OSError:
+            pass
+        self.esp._socket_closed(socket_num)
+
+
+class AsyncSocketPool:
+    """The asyncio counterpart of ``SocketPool``
+
+    :param AsyncESP radio: The commands to run sockets with
+    """
+
+    SOCK_STREAM = const(1)
+    SOCK_DGRAM = const(2)
+    AF_INET = const(2)
+
+    NO_SOCKET_AVAIL = const(255)
+    MAX_PACKET = const(4000)
+
+    def __init__(self, radio):
+        self._radio = radio
+
+    async def getaddrinfo(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        """Given a hostname and a port name, return a 'socket.getaddrinfo'
+        compatible list of tuples. Honestly, we ignore anything but host & port"""
+        if not isinstance(port, int):
+            raise ValueError("Port must be an integer")
+        ipaddr = await self._radio.get_host_by_name(host)
+        return [(AsyncSocketPool.AF_INET, socktype, proto, "", (ipaddr, port))]
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM, proto=0, fileno=None):
+        """Create a new socket and return it. It gets a socket number from the
+        ESP32 when it connects"""
+        return AsyncSocket(self, family, type, proto, fileno)
+
+
+class AsyncSocket:
+    """The asyncio counterpart of ``Socket``: connecting, sending and receiving
+    yield to other tasks while the ESP32 is busy or there is no data yet.
+
+    :param AsyncSocketPool socket_pool: The underlying socket pool.
+    """
+
+    max_poll_interval = 0.01
+    """The longest `recv_into` sleeps between checks for data while there is none,
+    see ``Socket.max_poll_interval``"""
+
+    def __init__(
+        self,
+        socket_pool,
+        family=AsyncSocketPool.AF_INET,
+        type=AsyncSocketPool.SOCK_STREAM,
+        proto=0,
+        fileno=None,
+    ):
+        if family != AsyncSocketPool.AF_INET:
+            raise ValueError("Only AF_INET family supported")
+        self._radio = socket_pool._radio
+        self._type = type
+        self._socknum = None
+        self.settimeout(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _conn_mode(self):
+        if self._type == AsyncSocketPool.SOCK_DGRAM:
+            return self._radio.UDP_MODE
+        return self._radio.TCP_MODE
+
+    async def _with_timeout(self, operation):
+        """Await operation, within the socket timeout if there is one"""
+        if self._timeout > 0:
+            return await asyncio.wait_for(operation, self._timeout / 1000)
+        return await operation
+
+    async def connect(self, address, conntype=None):
+        """Connect the socket to the 'address' (which can be 32bit packed IP or
+        a hostname string). 'conntype' is an extra that may indicate SSL or not,
+        depending on the underlying interface"""
+        host, port = address
+        if conntype is None:
+            conntype = self._conn_mode()
+        if not await self._with_timeout(self._connect(host, port, conntype)):
+            raise ConnectionError("Failed to connect to host", host)
+
+    async def _connect(self, host, port, conntype):
+        radio = self._radio
+        if self._socknum is not None:
+            return await radio.socket_connect(self._socknum, host, port, conn_mode=conntype)
+        async with radio._allocating:
+            self._socknum = await radio.get_socket()
+            await radio.socket_open(self._socknum, host, port, conn_mode=conntype)
+        return await radio._established(self._socknum, port, conntype)
+
+    def _connected_socknum(self):
+        """The socket number, OSError if there is none as the socket isn't connected"""
+        if self._socknum is None:
+            raise OSError(errno.ENOTCONN, "Socket not connected")
+        return self._socknum
+
+    async def send(self, data):
+        """Send some data to the socket."""
+        return await self._with_timeout(
+            self._radio.socket_write(self._connected_socknum(), data, conn_mode=self._conn_mode())
+        )
+
+    async def recv(self, bufsize):
+        """Reads some bytes from the connected remote address, see `recv_into`
+
+        :param int bufsize: maximum number of bytes to receive
+        """
+        buf = bytearray(bufsize)
+        num_read = await self.recv_into(buf, bufsize)
+        return bytes(buf[:num_read])
+
+    async def recv_into(self, buffer, nbytes=0):
+        """Read bytes from the connected remote address into a given buffer,
+        letting other tasks run until there are some.
+
+        :param bytearray buffer: the buffer to read into
+        :param int nbytes: maximum number of bytes to receive; if 0,
+            receive as many bytes as possible before filling the
+            buffer or timing out
+        """
+        if not 0 <= nbytes <= len(buffer):
+            raise ValueError("nbytes must be 0 to len(buffer)")
+        socknum = self._connected_socknum()
+        last_read_time = time.monotonic_ns()
+        num_to_read = len(buffer) if nbytes == 0 else nbytes
+        num_read = 0
+        interval = 0  # sleep before the next poll, 0 while data is flowing
+        count = self._radio.esp._count
+        while num_to_read > 0:
+            count("recv_polls")
+            num_avail = min(await self._radio.socket_available(socknum), AsyncSocketPool.MAX_PACKET)
+            if num_avail > 0:
+                interval = 0
+                last_read_time = time.monotonic_ns()
+                bytes_read = await self._radio.socket_readinto(
+                    socknum,
+                    memoryview(buffer)[num_read : num_read + min(num_to_read, num_avail)],
+                )
+                num_read += bytes_read
+                num_to_read -= bytes_read
+                continue
+            if num_read > 0 or self._timeout == 0:
+                break
+            delta = (time.monotonic_ns() - last_read_time) // 1_000_000
+            if self._timeout > 0 and delta > self._timeout:
+                raise OSError(errno.ETIMEDOUT)
+            # nothing yet, back off so an idle connection doesn't hog the bus
+            count("recv_idle_polls")
+            if interval:
+                if self._timeout > 0:
+                    interval = min(interval, (self._timeout - delta + 1) / 1000)
+                await asyncio.sleep(interval)
+            interval = _next_poll_interval(interval, self.max_poll_interval)
+        return num_read
+
+    async def close(self):
+        """Close the socket"""
+        if self._socknum is not None:
+            await self._radio.socket_close(self._socknum)
+            self._socknum = None
+
+    async def connected(self):
+        """Whether the socket is connected to its remote host"""
+        if self._socknum is None:
+            return False
+        if await self._radio.socket_available(self._socknum):
+            return True
+        return await self._radio.socket_status(self._socknum) not in _DISCONNECTED
+
+    def settimeout(self, value):
+        """Set the timeout for connecting, sending and receiving in seconds.
+        ``0`` means non-blocking. ``None`` means block indefinitely.
+        """
+        if value is None:
+            self._timeout = -1
+        else:
+            if value < 0:
+                raise ValueError("Timeout cannot be a negative number")
+            # internally in milliseconds as an int
+            self._timeout = int(value * 1000)
+
+    def setblocking(self, flag):
+        """Set the blocking behaviour of this socket.
+        :param bool flag: False means non-blocking, True means block indefinitely.
+        """
+        self.settimeout(None if flag else 0)
@@ -0,0 +1,405 @@
+# SPDX-FileCopyrightText: Copyright (c) 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`recorder`
+================================================================================
+
+Record the SPI conversation between ``ESP_SPIcontrol`` and the ESP32, and play it
+back later without any hardware.
+
+`SPIRecorder` sits between the driver and the real SPI bus, chip select and ready
+pins, and logs every frame written and every byte read while the ESP32 is selected,
+plus every change of the ready pin, each with a timestamp, to a compact binary log.
+`SPIReplay` provides a bus and pins that answer ``ESP_SPIcontrol`` from such a log, so
+a session captured once can be replayed to profile or benchmark the parsing and
+socket layers, repeatably and with no radio or timing noise involved.
+
+.. code:: python
+
+    # on the device
+    with open("/session.bin", "wb") as log:
+        recorder = SPIRecorder(spi, esp32_cs, esp32_ready, log)
+        esp = ESP_SPIcontrol(recorder.spi, recorder.cs, recorder.ready, esp32_reset)
+        ...
+
+    # later, anywhere
+    with open("session.bin", "rb") as log:
+        replay = SPIReplay(log.read())
+    esp = ESP_SPIcontrol(replay.spi, replay.cs, replay.ready, replay.reset)
+    ...
+
+A log starts with the 4 byte magic ``b"ESPR"`` and a version byte. Each record is a
+kind byte, the microseconds since the previous record and the data length, both as
+little endian 32 bit numbers, followed by the data. See `read_records`.
+"""
+
+import struct
+import time
+
+from micropython import const
+
+__version__ = "0.0.0+auto.0"
+__repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_ESP32SPI.git"
+
+RECORD_WRITE = const(1)
+"""A frame written to the ESP32"""
+RECORD_READ = const(2)
+"""Bytes read from the ESP32"""
+RECORD_READY = const(3)
+"""The ready pin changed, the data is its new value"""
+
+_MAGIC = b"ESPR"
+_VERSION = const(1)
+_RECORD_HEADER = "<BII"
+_RECORD_HEADER_LEN = const(9)
+
+
+def read_records(log):
+    """Parse a recorded log, given as bytes, into a list of ``(timestamp_us, kind, data)``
+    tuples. Timestamps count from the start of the recording, kind is one of
+    `RECORD_WRITE`, `RECORD_READ` or `RECORD_READY`."""
+    log = memoryview(log)
+    if bytes(log[:4]) != _MAGIC or len(log) < 5:
+        raise ValueError("Not an SPI recording")
+    if log[4] != _VERSION:
+        raise ValueError(f"Unsupported recording version {log[4]}")
+    records = []
+    timestamp = 0
+    ptr = 5
+    while ptr < len(log):
+        if ptr + _RECORD_HEADER_LEN > len(log):
+            raise ValueError("Truncated recording")
+        kind, delta, length = struct.unpack_from(_RECORD_HEADER, log, ptr)
+        ptr += _RECORD_HEADER_LEN
+        timestamp += delta
+        records.append((timestamp, kind, bytes(log[ptr : ptr + length])))
+        ptr += length
+    return records
+
+
+class SPIRecorder:
+    """Wraps the SPI bus, chip select and ready pins of an ESP32, passing everything
+    through while writing a log of the conversation to stream, any object with a
+    ``write`` method such as an open file. Hand `spi`, `cs` and `ready` to
+    ``ESP_SPIcontrol`` in place of the real ones. Only traffic while the ESP32 is
+    selected is recorded, so other devices may share the bus."""
+
+    def __init__(self, spi, cs_dio, ready_dio, stream):
+        self._stream = stream
+        self._header = bytearray(_RECORD_HEADER_LEN)
+        self._last_ns = time.monotonic_ns()
+        self.spi = _RecordingSPI(spi, self)
+        """The SPI bus to give to ``ESP_SPIcontrol``"""
+        self.cs = _RecordingChipSelect(cs_dio)
+        """The chip select pin to give to ``ESP_SPIcontrol``"""
+        self.ready = _RecordingReady(ready_dio, self)
+        """The ready pin to give to ``ESP_SPIcontrol``"""
+        stream.write(_MAGIC + bytes((_VERSION,)))
+
+    def _record(self, kind, data, start=0, end=None):
+        """Append a record with data[start:end] to the log"""
+        if end is None:
+            end = len(data)
+        now = time.monotonic_ns()
+        delta = (now - self._last_ns) // 1000
+        self._last_ns = now
+        struct.pack_into(_RECORD_HEADER, self._header, 0, kind, delta, end - start)
+        self._stream.write(self._header)
+        if end > start:
+            self._stream.write(memoryview(data)[start:end])
+
+    @property
+    def selected(self):
+        """True while the ESP32 is selected and transfers are recorded"""
+        return not self.cs.value
+
+
+class _RecordingSPI:
+    """``busio.SPI`` wrapper that records transfers while the ESP32 is selected"""
+
+    def __init__(self, spi, recorder):
+        self._spi = spi
+        self._recorder = recorder
+
+    def try_lock(self):
+        """Attempt to grab the bus lock"""
+        return self._spi.try_lock()
+
+    def unlock(self):
+        """Release the bus lock"""
+        self._spi.unlock()
+
+    def configure(self, **kwargs):
+        """Configure the bus"""
+        self._spi.configure(**kwargs)
+
+    @property
+    def frequency(self):
+        """The actual clock rate of the bus"""
+        return self._spi.frequency
+
+    def write(self, buf, *, start=0, end=None):
+        """Write buf[start:end], and record it"""
+        if end is None:
+            end = len(buf)
+        self._spi.write(buf, start=start, end=end)
+        if self._recorder.selected:
+            self._recorder._record(RECORD_WRITE, buf, start, end)
+
+    def readinto(self, buf, *, start=0, end=None, write_value=0):
+        """Read into buf[start:end], and record what was read"""
+        if end is None:
+            end = len(buf)
+        self._spi.readinto(buf, start=start, end=end, write_value=write_value)
+        if self._recorder.selected:
+            self._recorder._record(RECORD_READ, buf, start, end)
+
+    def write_readinto(
+        self, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None
+    ):
+        """Write and read at the same time, and record both"""
+        if out_end is None:
+            out_end = len(buffer_out)
+        if in_end is None:
+            in_end = len(buffer_in)
+        self._spi.write_readinto(
+            buffer_out,
+            buffer_in,
+            out_start=out_start,
+            out_end=out_end,
+            in_start=in_start,
+            in_end=in_end,
+        )
+        if self._recorder.selected:
+            self._recorder._record(RECORD_WRITE, buffer_out, out_start, out_end)
+            self._recorder._record(RECORD_READ, buffer_in, in_start, in_end)
+
+
+class _RecordingChipSelect:
+    """Chip select wrapper, so the recorder knows when the ESP32 is selected"""
+
+    def __init__(self, pin):
+        self._pin = pin
+        self._value = True
+
+    def switch_to_output(self, value=False, **kwargs):
+        """Switch the pin to an output with the given value"""
+        self._pin.switch_to_output(value=value, **kwargs)
+        self._value = bool(value)
+
+    @property
+    def direction(self):
+        """The direction of the pin"""
+        return self._pin.direction
+
+    @direction.setter
+    def direction(self, direction):
+        self._pin.direction = direction
+
+    @property
+    def value(self):
+        """The logic level of the pin"""
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        self._pin.value = val
+        self._value = bool(val)
+
+
+class _RecordingReady:
+    """Ready pin wrapper that records every change of its value"""
+
+    def __init__(self, pin, recorder):
+        self._pin = pin
+        self._recorder = recorder
+        self._value = bytearray(1)
+        self._value[0] = 0xFF  # nothing read yet
+
+    @property
+    def direction(self):
+        """The direction of the pin"""
+        return self._pin.direction
+
+    @direction.setter
+    def direction(self, direction):
+        self._pin.direction = direction
+
+    @property
+    def value(self):
+        """The logic level of the pin"""
+        value = self._pin.value
+        if value != self._value[0]:
+            self._value[0] = value
+            self._recorder._record(RECORD_READY, self._value)
+        return value
+
+
+class SPIReplay:
+    """An SPI bus plus chip select, ready and reset pins that play a log recorded by
+    `SPIRecorder` back to ``ESP_SPIcontrol``.
+
+    Every frame the driver writes is matched against the next frame in the log, and
+    the bytes that followed it in the recording are what the driver then reads. With
+    strict, a frame that differs from the recording raises ValueError, since the
+    replies that follow would make no sense. The ready pin simply reports the ESP32 as
+    ready whenever it is deselected and acknowledges every select, unless realtime is
+    set, in which case transfers are held back until their recorded time."""
+
+    def __init__(self, log, *, strict=True, realtime=False):
+        records = read_records(log)
+        # every write with the reads that followed it, up to the next write
+        self._frames = []
+        for timestamp, kind, data in records:
+            if kind == RECORD_WRITE:
+                self._frames.append((timestamp, data, bytearray()))
+            elif kind == RECORD_READ and self._frames:
+                self._frames[-1][2].extend(data)
+        self._strict = strict
+        self._realtime = realtime
+        self._index = 0
+        self._pending = b""
+        self._pending_ptr = 0
+        self._start_ns = None
+        self.transfers = 0
+        """Number of SPI transfers replayed so far"""
+        self.spi = _ReplaySPI(self)
+        """The SPI bus to give to ``ESP_SPIcontrol``"""
+        self.cs = _ReplayPin(True)
+        """The chip select pin to give to ``ESP_SPIcontrol``"""
+        self.ready = _ReplayReady(self.cs)
+        """The ready pin to give to ``ESP_SPIcontrol``"""
+        self.reset = _ReplayPin(True)
+        """The reset pin to give to ``ESP_SPIcontrol``"""
+        self.gpio0 = _ReplayPin(True)
+        """The GPIO0 pin to give to ``ESP_SPIcontrol``"""
+
+    @property
+    def finished(self):
+        """True once every recorded frame has been replayed"""
+        return self._index >= len(self._frames)
+
+    def rewind(self):
+        """Start over from the beginning of the log"""
+        self._index = 0
+        self._pending = b""
+        self._pending_ptr = 0
+        self._start_ns = None
+
+    def _wait_until(self, timestamp_us):
+        """With realtime, hold back until timestamp_us into the replay"""
+        if self._start_ns is None:
+            self._start_ns = time.monotonic_ns() - timestamp_us * 1000
+        if self._realtime:
+            while (time.monotonic_ns() - self._start_ns) // 1000 < timestamp_us:
+                pass
+
+    def _write(self, buf, start, end):
+        """The driver wrote a frame, check it and queue up the reply that followed it"""
+        self.transfers += 1
+        if self._index >= len(self._frames):
+            raise EOFError("End of the SPI recording")
+        timestamp, frame, reply = self._frames[self._index]
+        self._index += 1
+        self._wait_until(timestamp)
+        if self._strict and bytes(memoryview(buf)[start:end]) != frame:
+            raise ValueError(
+                f"Replay diverged at frame {self._index - 1}, "
+                + f"expected {bytes(frame)!r} got {bytes(buf[start:end])!r}"
+            )
+        self._pending = reply
+        self._pending_ptr = 0
+
+    def _read(self, buf, start, end):
+        """The driver reads, hand out the recorded reply, then 0xFF padding"""
+        self.transfers += 1
+        count = min(end - start, len(self._pending) - self._pending_ptr)
+        if count > 0:
+            buf[start : start + count] = self._pending[
+                self._pending_ptr : self._pending_ptr + count
+            ]
+            self._pending_ptr += count
+        for i in range(start + max(count, 0), end):
+            buf[i] = 0xFF
+
+
+class _ReplaySPI:
+    """``busio.SPI`` stand-in that answers from an `SPIReplay`"""
+
+    def __init__(self, replay):
+        self._replay = replay
+        self._locked = False
+        self.frequency = 0
+
+    def try_lock(self):
+        """Attempt to grab the bus lock"""
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        """Release the bus lock"""
+        self._locked = False
+
+    def configure(self, *, baudrate=100000, polarity=0, phase=0, bits=8):
+        """Record the requested clock rate, everything else is ignored"""
+        self.frequency = baudrate
+
+    def write(self, buf, *, start=0, end=None):
+        """Check a written frame against the recording"""
+        if end is None:
+            end = len(buf)
+        self._replay._write(buf, start, end)
+
+    def readinto(self, buf, *, start=0, end=None, write_value=0):
+        """Read recorded bytes"""
+        if end is None:
+            end = len(buf)
+        self._replay._read(buf, start, end)
+
+    def write_readinto(
+        self, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None
+    ):
+        """Write and read at the same time"""
+        if out_end is None:
+            out_end = len(buffer_out)
+        if in_end is None:
+            in_end = len(buffer_in)
+        self._replay._write(buffer_out, out_start, out_end)
+        self._replay._read(buffer_in, in_start, in_end)
+
+
+class _ReplayPin:
+    """A ``digitalio.DigitalInOut`` stand-in that just remembers its state"""
+
+    def __init__(self, value=False):
+        self.direction = None
+        self.value = value
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        """Switch the pin to an output with the given value"""
+        self.value = value
+
+    def switch_to_input(self, pull=None):
+        """Switch the pin to an input"""
+
+
+class _ReplayReady(_ReplayPin):
+    """Ready pin that is low (ready) while deselected and high (acknowledged) while
+    selected"""
+
+    def __init__(self, cs):
+        super().__init__()
+        self._cs = cs
+
+    @property
+    def value(self):
+        """The logic level of the pin"""
+        return not self._cs.value
+
+    @value.setter
+    def value(self, val):
+        pass
@@ -0,0 +1,43 @@
+# SPDX-FileCopyrightText: Copyright (c) 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Fixtures running the driver against the simulator in tools/"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+from esp32spi_simulator import ESP32Simulator  # noqa: E402
+
+from adafruit_esp32spi import adafruit_esp32spi  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    """A simulated ESP32"""
+    simulator = ESP32Simulator()
+    yield simulator
+    simulator.close()
+
+
+@pytest.fixture
+def esp(sim):
+    """A driver on the simulated ESP32, connected to its access point"""
+    driver = adafruit_esp32spi.ESP_SPIcontrol(sim.spi, sim.cs, sim.ready, sim.reset, stats=True)
+    driver.connect_AP("Simulated", "password")
+    return driver
+
+
+@pytest.fixture
+def server():
+    """A listening host socket the simulated ESP32 can connect to"""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+    yield listener
+    listener.close()
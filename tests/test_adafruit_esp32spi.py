@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: Copyright (c) 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""ESP_SPIcontrol against the simulated ESP32"""
+
+import threading
+
+import pytest
+
+from adafruit_esp32spi import adafruit_esp32spi
+
+
+def _run_in_thread(function, timeout=10):
+    """Run function in a thread, failing rather than hanging if it deadlocks"""
+    errors = []
+
+    def run():
+        try:
+            function()
+        except Exception as error:  # noqa: BLE001
+            errors.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "deadlocked"
+    if errors:
+        raise errors[0]
+
+
+@pytest.mark.parametrize("lock_type", [threading.Lock, threading.RLock])
+def test_lock_need_not_be_reentrant(sim, lock_type):
+    drivers = []
+
+    def start():
+        drivers.append(
+            adafruit_esp32spi.ESP_SPIcontrol(
+                sim.spi, sim.cs, sim.ready, sim.reset, lock=lock_type()
+            )
+        )
+        drivers[0].reset()
+        drivers[0].connect_AP("Simulated", "password")
+
+    _run_in_thread(start)
+    esp = drivers[0]
+
+    def several_commands():
+        with esp.lock:
+            assert esp.status == adafruit_esp32spi.WL_CONNECTED
+            assert esp.firmware_version == sim.firmware_version
+
+    _run_in_thread(several_commands)
+
+    statuses = []
+
+    def poll():
+        for _ in range(50):
+            statuses.append(esp.status)
+
+    def poll_from_threads():
+        threads = [threading.Thread(target=poll) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    _run_in_thread(poll_from_threads)
+    assert statuses == [adafruit_esp32spi.WL_CONNECTED] * 200
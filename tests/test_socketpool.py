@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: Copyright (c) 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Socket against the simulated ESP32"""
+
+import threading
+
+import pytest
+
+from adafruit_esp32spi import adafruit_esp32spi
+from adafruit_esp32spi.adafruit_esp32spi_socketpool import SocketPool
+
+
+@pytest.fixture
+def connection(esp, server):
+    """A connected Socket and the host's end of it"""
+    sock = SocketPool(esp).socket()
+    sock.connect(server.getsockname())
+    peer, _ = server.accept()
+    yield sock, peer
+    peer.close()
+    sock.close()
+
+
+def test_read_of_empty_socket_is_an_error(esp, connection):
+    sock, _ = connection
+    with pytest.raises(adafruit_esp32spi.CommandError):
+        esp.socket_readinto(sock._socknum, bytearray(10))
+
+
+@pytest.mark.parametrize("optimistic", [True, False])
+def test_recv_into_waits_for_data(connection, optimistic):
+    sock, peer = connection
+    sock.optimistic_recv = optimistic
+    sock.settimeout(2)
+    threading.Timer(0.1, peer.sendall, (b"hello",)).start()
+    buffer = bytearray(10)
+    assert sock.recv_into(buffer) == 5
+    assert buffer[:5] == b"hello"
+
+
+def test_optimistic_recv_into_stops_after_partial_chunk(connection):
+    sock, peer = connection
+    peer.sendall(b"abc")
+    sock.settimeout(2)
+    buffer = bytearray(10)
+    # the read after the chunk finds nothing and stops rather than failing
+    assert sock.recv_into(buffer) == 3
+    assert buffer[:3] == b"abc"
+
+
+def test_optimistic_recv_into_non_blocking(connection):
+    sock, _ = connection
+    sock.setblocking(False)
+    assert sock.recv_into(bytearray(10)) == 0
+
+
+def test_optimistic_recv_into_times_out(connection):
+    sock, _ = connection
+    sock.settimeout(0.1)
+    with pytest.raises(OSError):
+        sock.recv_into(bytearray(10))
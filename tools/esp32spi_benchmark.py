@@ -0,0 +1,455 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+"""
+Throughput and latency benchmark for the ESP32SPI command path.
+
+Runs on a host computer (CPython with Blinka) against the simulated coprocessor in
+``esp32spi_simulator``, so results only reflect the cost of the driver itself.
+Results are printed (or written) as JSON so that releases can be compared:
+
+    python tools/esp32spi_benchmark.py --output before.json
+
+With ``--replay``, it instead times every command of a session recorded on real
+hardware with ``adafruit_esp32spi.recorder.SPIRecorder``, answered from the log:
+
+    python tools/esp32spi_benchmark.py --replay session.bin --iterations 10
+"""
+
+import argparse
+import json
+import platform
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+from esp32spi_simulator import ESP32Simulator
+
+from adafruit_esp32spi import adafruit_esp32spi
+from adafruit_esp32spi.recorder import RECORD_WRITE, SPIReplay, read_records
+from adafruit_esp32spi.socketpool import SocketPool
+
+PAYLOAD_SIZES = (64, 256, 1024, 4000)
+
+
+def start_server(handler):
+    """Start a loopback TCP server that runs handler(conn) for every connection"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(5)
+
+    def serve():
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=handler, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def sink(conn):
+    """Read and throw away everything"""
+    with conn:
+        while conn.recv(65536):
+            pass
+
+
+def source(conn):
+    """Send zeros until the other side goes away"""
+    data = bytes(65536)
+    with conn:
+        try:
+            while True:
+                conn.sendall(data)
+        except OSError:
+            pass
+
+
+def summarize(samples):
+    """Latency statistics in microseconds"""
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        "count": count,
+        "min_us": samples[0] / 1000,
+        "mean_us": sum(samples) / count / 1000,
+        "median_us": samples[count // 2] / 1000,
+        "p95_us": samples[min(count - 1, count * 95 // 100)] / 1000,
+        "max_us": samples[-1] / 1000,
+    }
+
+
+def time_calls(sim, func, iterations):
+    """Time each call of func(), and count the SPI transfers it takes"""
+    samples = []
+    transfers = sim.transfers
+    for _ in range(iterations):
+        start = time.monotonic_ns()
+        func()
+        samples.append(time.monotonic_ns() - start)
+    result = summarize(samples)
+    result["spi_transfers"] = (sim.transfers - transfers) / iterations
+    return result
+
+
+def bench_commands(esp, pool, sim, sink_port, source_port, iterations):
+    """Round trip time of the most common commands"""
+    results = {}
+    results["status"] = time_calls(sim, lambda: esp.status, iterations)
+
+    writer = pool.socket()
+    writer.connect(("127.0.0.1", sink_port))
+    payload = bytes(64)
+    results["socket_available"] = time_calls(
+        sim, lambda: esp.socket_available(writer._socknum), iterations
+    )
+    results["socket_write"] = time_calls(
+        sim, lambda: esp.socket_write(writer._socknum, payload), iterations
+    )
+    writer.close()
+
+    reader = pool.socket()
+    reader.connect(("127.0.0.1", source_port))
+    while esp.socket_available(reader._socknum) < 64:
+        pass
+    results["socket_read"] = time_calls(
+        sim, lambda: esp.socket_read(reader._socknum, 64), iterations
+    )
+    buffer = bytearray(64)
+    results["socket_readinto"] = time_calls(
+        sim, lambda: esp.socket_readinto(reader._socknum, buffer), iterations
+    )
+    reader.close()
+    return results
+
+
+def bench_framing_allocations(esp, pool, sim, sink_port, iterations):
+    """Heap bytes allocated while a command is framed, measured as the traced memory
+    peak between the start of each call and its first bus write. The "bus_only"
+    entry is the cost of just waiting for ready and selecting the bus (including the
+    measurement itself), "framing_bytes" is what each command adds on top of that."""
+    sock = pool.socket()
+    sock.connect(("127.0.0.1", sink_port))
+    small = bytes(64)
+    large = bytes(max(esp.write_chunk_size, 4000))
+    empty = b""
+
+    def bus_only():
+        esp._wait_for_ready(esp._timeout)
+        with esp._transport as spi:
+            esp._wait_for_select(esp._select_timeout)
+            spi.write(empty)
+
+    calls = {
+        "bus_only": bus_only,
+        "status": lambda: esp.status,
+        "socket_available": lambda: esp.socket_available(sock._socknum),
+        "socket_write_small": lambda: esp.socket_write(sock._socknum, small),
+        "socket_write_large": lambda: esp.socket_write(sock._socknum, large),
+    }
+
+    write = sim.spi.write
+    window = {}
+
+    def traced_write(buf, *, start=0, end=None):
+        if "baseline" in window:
+            window["peak"] = tracemalloc.get_traced_memory()[1] - window.pop("baseline")
+        write(buf, start=start, end=end)
+
+    results = {}
+    sim.spi.write = traced_write
+    tracemalloc.start()
+    try:
+        for name, func in calls.items():
+            func()  # warm up, so buffers have grown to their steady-state size
+            peak = 0
+            for _ in range(iterations):
+                tracemalloc.reset_peak()
+                window["baseline"] = tracemalloc.get_traced_memory()[0]
+                func()
+                peak = max(peak, window["peak"])
+            results[name] = {"peak_bytes": peak}
+    finally:
+        tracemalloc.stop()
+        sim.spi.write = write
+    sock.close()
+    for result in results.values():
+        result["framing_bytes"] = max(0, result["peak_bytes"] - results["bus_only"]["peak_bytes"])
+    results["socket_write_small"]["size"] = len(small)
+    results["socket_write_large"]["size"] = len(large)
+    return results
+
+
+def bench_reply_allocations(esp, pool, sim, sink_port, iterations):
+    """Heap bytes allocated while the reply of a single command is read and parsed,
+    measured as the traced memory peak between the first bus read and the return.
+    "bus_only" is a bare one byte read, "parse_bytes" is what each reply adds to it."""
+    sock = pool.socket()
+    sock.connect(("127.0.0.1", sink_port))
+    scratch = bytearray(1)
+
+    def bus_only():
+        # the ESP32 takes a read with no reply pending as a command, the second read
+        # clocks out its error reply to keep in step
+        for _ in range(2):
+            with esp._transport as spi:
+                spi.readinto(scratch)
+
+    calls = {
+        "bus_only": bus_only,
+        "status": lambda: esp.status,
+        "socket_status": lambda: esp.socket_status(sock._socknum),
+        "socket_available": lambda: esp.socket_available(sock._socknum),
+    }
+
+    readinto = sim.spi.readinto
+    window = {}
+
+    def traced_readinto(buf, *, start=0, end=None, write_value=0):
+        if "baseline" not in window:
+            tracemalloc.reset_peak()
+            window["baseline"] = tracemalloc.get_traced_memory()[0]
+        readinto(buf, start=start, end=end, write_value=write_value)
+
+    results = {}
+    sim.spi.readinto = traced_readinto
+    tracemalloc.start()
+    try:
+        for name, func in calls.items():
+            func()
+            peak = 0
+            for _ in range(iterations):
+                window.clear()
+                func()
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - window["baseline"])
+            results[name] = {"peak_bytes": peak}
+    finally:
+        tracemalloc.stop()
+        sim.spi.readinto = readinto
+    sock.close()
+    for result in results.values():
+        result["parse_bytes"] = max(0, result["peak_bytes"] - results["bus_only"]["peak_bytes"])
+    return results
+
+
+def bench_send(pool, sim, port, size, total):
+    """Bulk TCP send of total bytes, size bytes at a time"""
+    sock = pool.socket()
+    sock.connect(("127.0.0.1", port))
+    payload = bytes(size)
+    sent = 0
+    commands = sim.commands_handled
+    start = time.monotonic_ns()
+    while sent < total:
+        sent += sock.send(payload)
+    elapsed = time.monotonic_ns() - start
+    commands = sim.commands_handled - commands
+    sock.close()
+    return {
+        "bytes": sent,
+        "seconds": elapsed / 1e9,
+        "bytes_per_s": sent * 1e9 / elapsed,
+        "spi_commands": commands,
+    }
+
+
+def bench_recv(pool, sim, port, size, total):
+    """Bulk TCP receive of total bytes into a size byte buffer"""
+    sock = pool.socket()
+    sock.connect(("127.0.0.1", port))
+    buffer = bytearray(size)
+    received = 0
+    commands = sim.commands_handled
+    start = time.monotonic_ns()
+    while received < total:
+        received += sock.recv_into(buffer)
+    elapsed = time.monotonic_ns() - start
+    commands = sim.commands_handled - commands
+    sock.close()
+    return {
+        "bytes": received,
+        "seconds": elapsed / 1e9,
+        "bytes_per_s": received * 1e9 / elapsed,
+        "spi_commands": commands,
+    }
+
+
+def recorded_commands(log):
+    """The commands written in a recorded session, as (cmd, params) pairs"""
+    commands = []
+    for _, kind, frame in read_records(log):
+        if kind != RECORD_WRITE:
+            continue
+        if len(frame) < 4 or frame[0] != adafruit_esp32spi._START_CMD:
+            raise ValueError(f"Not a command frame: {frame!r}")
+        cmd = frame[1]
+        flags = adafruit_esp32spi._COMMANDS.get(cmd, (None, None, None, 0))[3]
+        params = []
+        ptr = 3
+        for _ in range(frame[2]):
+            param_len = frame[ptr]
+            ptr += 1
+            if flags & adafruit_esp32spi._CMD_SENT_LEN_16:
+                param_len = (param_len << 8) | frame[ptr]
+                ptr += 1
+            params.append(frame[ptr : ptr + param_len])
+            ptr += param_len
+        commands.append((cmd, params))
+    return commands
+
+
+def bench_replay(esp, replay, commands, iterations):
+    """Round trip time of every command in a recorded session, replayed iterations
+    times over, plus the socket data it sent and received"""
+    samples = {}
+    errors = {}
+    bulk = {"send": [0, 0], "recv": [0, 0]}  # bytes and nanoseconds
+    transfers = replay.transfers
+    for _ in range(iterations):
+        replay.rewind()
+        for cmd, params in commands:
+            start = time.monotonic_ns()
+            try:
+                response = esp._send_command_get_response(cmd, params)
+            except OSError:  # the recorded reply was an error, or garbled
+                errors[cmd] = errors.get(cmd, 0) + 1
+                continue
+            elapsed = time.monotonic_ns() - start
+            samples.setdefault(cmd, []).append(elapsed)
+            if cmd in {
+                adafruit_esp32spi._SEND_DATA_TCP_CMD,
+                adafruit_esp32spi._INSERT_DATABUF_TCP_CMD,
+            }:
+                bulk["send"][0] += len(params[1])
+                bulk["send"][1] += elapsed
+            elif cmd == adafruit_esp32spi._GET_DATABUF_TCP_CMD:
+                bulk["recv"][0] += len(response[0])
+                bulk["recv"][1] += elapsed
+    results = {"commands": {}, "spi_transfers": replay.transfers - transfers}
+    for cmd in sorted(set(samples) | set(errors)):
+        result = summarize(samples[cmd]) if cmd in samples else {"count": 0}
+        result["errors"] = errors.get(cmd, 0)
+        results["commands"][f"0x{cmd:02X}"] = result
+    for name, (size, elapsed) in bulk.items():
+        results[name] = {
+            "bytes": size,
+            "seconds": elapsed / 1e9,
+            "bytes_per_s": size * 1e9 / elapsed if elapsed else None,
+        }
+    return results
+
+
+def replay_report(args):
+    """Benchmark a recorded session, see bench_replay"""
+    with open(args.replay, "rb") as recording:
+        log = recording.read()
+    commands = recorded_commands(log)
+    replay = SPIReplay(log)
+    esp = adafruit_esp32spi.ESP_SPIcontrol(
+        replay.spi,
+        replay.cs,
+        replay.ready,
+        replay.reset,
+        write_chunk_size=args.write_chunk_size,
+        stats=args.stats,
+    )
+    esp.reset_stats()  # just the replayed commands, not the boot probe
+    report = {
+        "version": adafruit_esp32spi.__version__,
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "transport": "replay",
+        "recording": args.replay,
+        "recorded_commands": len(commands),
+        "replay": bench_replay(esp, replay, commands, args.iterations),
+    }
+    return esp, report
+
+
+def simulator_report(args):
+    """Run every benchmark against the simulator"""
+    sim = ESP32Simulator()
+    esp = adafruit_esp32spi.ESP_SPIcontrol(
+        sim.spi,
+        sim.cs,
+        sim.ready,
+        sim.reset,
+        write_chunk_size=args.write_chunk_size,
+        stats=args.stats,
+    )
+    esp.connect_AP("Simulated", "password")
+    pool = SocketPool(esp)
+    sink_port = start_server(sink)
+    source_port = start_server(source)
+
+    report = {
+        "version": adafruit_esp32spi.__version__,
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "transport": "simulator",
+        "write_chunk_size": args.write_chunk_size,
+        "commands": bench_commands(esp, pool, sim, sink_port, source_port, args.iterations),
+        "framing_allocations": bench_framing_allocations(
+            esp, pool, sim, sink_port, args.iterations
+        ),
+        "reply_allocations": bench_reply_allocations(esp, pool, sim, sink_port, args.iterations),
+        "send": {},
+        "recv": {},
+    }
+    for size in args.sizes:
+        report["send"][str(size)] = bench_send(pool, sim, sink_port, size, args.total)
+        report["recv"][str(size)] = bench_recv(pool, sim, source_port, size, args.total)
+    sim.close()
+    return esp, report
+
+
+def main():
+    """Run every benchmark and report the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=1000,
+        help="calls per command, or passes over the recording with --replay",
+    )
+    parser.add_argument("--total", type=int, default=256 * 1024, help="bytes per bulk run")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=PAYLOAD_SIZES,
+        help="payload sizes for the bulk runs",
+    )
+    parser.add_argument(
+        "--write-chunk-size", type=int, default=64, help="ESP_SPIcontrol.write_chunk_size"
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="collect and report ESP_SPIcontrol.stats"
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="LOG",
+        help="time the commands of a session recorded with SPIRecorder instead",
+    )
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.replay:
+        esp, report = replay_report(args)
+    else:
+        esp, report = simulator_report(args)
+    if args.stats:
+        stats = esp.stats
+        stats["commands"] = {f"0x{cmd:02X}": entry for cmd, entry in stats["commands"].items()}
+        report["driver_stats"] = stats
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
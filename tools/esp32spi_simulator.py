@@ -0,0 +1,800 @@
+# SPDX-FileCopyrightText: Copyright (c) 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+`esp32spi_simulator`
+================================================================================
+
+A pure-Python stand-in for an ESP32 running NINA-fw, for testing and benchmarking
+``ESP_SPIcontrol`` on a host computer without any hardware attached.
+
+The simulator provides an SPI bus plus chip select, ready, reset and GPIO0 pins that
+can be handed straight to ``ESP_SPIcontrol``. Command frames written over the fake bus
+are parsed and answered the way the firmware would, with sockets backed by real
+TCP/UDP sockets on the host (typically loopback).
+
+Like the firmware, it strictly alternates between command and reply transactions:
+once a command has been received, the next transaction clocks out its reply whatever
+the host writes, and a transaction while no reply is pending is taken as a command
+even if the host only reads. A driver that gives up on a reply gets out of step the
+same way it would with a real ESP32.
+
+This is a host tool, not part of the library: it only runs under CPython (for example
+with Blinka) since it relies on the ``socket`` and ``ssl`` modules of the host. Run
+from this directory, or put it on the path.
+
+.. code:: python
+
+    from adafruit_esp32spi import adafruit_esp32spi
+    from esp32spi_simulator import ESP32Simulator
+
+    sim = ESP32Simulator()
+    esp = adafruit_esp32spi.ESP_SPIcontrol(sim.spi, sim.cs, sim.ready, sim.reset)
+    esp.connect_AP("Simulated", "password")
+"""
+
+import socket
+import ssl
+import struct
+import time
+
+from adafruit_esp32spi import adafruit_esp32spi as esp32spi
+
+# Framing comes from the driver's command table, so both sides always agree.
+# Commands whose parameters are sent with 16 bit lengths
+_SEND_PARAM_LEN_16 = {
+    cmd for cmd, entry in esp32spi._COMMANDS.items() if entry[3] & esp32spi._CMD_SENT_LEN_16
+}
+# Commands whose reply parameters are sent with 16 bit lengths
+_REPLY_PARAM_LEN_16 = {
+    cmd for cmd, entry in esp32spi._COMMANDS.items() if entry[3] & esp32spi._CMD_RECV_LEN_16
+}
+
+_NO_SOCKET = 255
+# what the firmware answers a frame it can't handle with
+_ERROR_REPLY = bytes((esp32spi._ERR_CMD, 0x00, esp32spi._END_CMD))
+# Bytes buffered per TCP socket, like the firmware's receive window
+_RX_WINDOW = 5744
+
+
+class SimulatedPin:
+    """A minimal ``digitalio.DigitalInOut`` stand-in that just remembers its state."""
+
+    def __init__(self, value=False):
+        self.direction = None
+        self._value = value
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        """Switch the pin to an output with the given value"""
+        self.value = value
+
+    def switch_to_input(self, pull=None):
+        """Switch the pin to an input"""
+
+    @property
+    def value(self):
+        """The logic level of the pin"""
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        self._value = bool(val)
+
+
+class _ChipSelectPin(SimulatedPin):
+    """Chip select line, tells the simulator when a transaction starts and ends"""
+
+    def __init__(self, simulator):
+        super().__init__(True)
+        self._simulator = simulator
+
+    @SimulatedPin.value.setter
+    def value(self, val):
+        val = bool(val)
+        if val != self._value:
+            self._value = val
+            if val:
+                self._simulator._deselect()
+            else:
+                self._simulator._select()
+
+
+class _ReadyPin(SimulatedPin):
+    """Ready (busy) line, driven by the simulator"""
+
+    def __init__(self, simulator):
+        super().__init__()
+        self._simulator = simulator
+
+    @SimulatedPin.value.getter
+    def value(self):
+        return self._simulator._busy()
+
+
+class _ResetPin(SimulatedPin):
+    """Reset line, reboots the simulator on a low to high transition"""
+
+    def __init__(self, simulator):
+        super().__init__(True)
+        self._simulator = simulator
+
+    @SimulatedPin.value.setter
+    def value(self, val):
+        val = bool(val)
+        if val and not self._value:
+            self._simulator.reboot()
+        self._value = val
+
+
+class SimulatedSPI:
+    """A ``busio.SPI`` stand-in that exchanges bytes with an `ESP32Simulator`"""
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._locked = False
+        self.frequency = 0
+
+    def try_lock(self):
+        """Attempt to grab the bus lock"""
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        """Release the bus lock"""
+        self._locked = False
+
+    def configure(self, *, baudrate=100000, polarity=0, phase=0, bits=8):
+        """Record the requested clock rate, everything else is ignored"""
+        self.frequency = baudrate
+
+    def write(self, buf, *, start=0, end=None):
+        """Send bytes to the simulated ESP32"""
+        if end is None:
+            end = len(buf)
+        self._simulator._receive(buf, start, end)
+
+    def readinto(self, buf, *, start=0, end=None, write_value=0):
+        """Read bytes from the simulated ESP32, clocking out write_value"""
+        if end is None:
+            end = len(buf)
+        self._simulator._transmit(buf, start, end, write_value)
+
+    def write_readinto(
+        self, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None
+    ):
+        """Read and write at the same time, for completeness"""
+        if out_end is None:
+            out_end = len(buffer_out)
+        if in_end is None:
+            in_end = len(buffer_in)
+        self._simulator._receive(buffer_out, out_start, out_end)
+        self._simulator._transmit(buffer_in, in_start, in_end, None)
+
+
+class _SimSocket:
+    """Firmware side state for one socket number"""
+
+    def __init__(self):
+        self.sock = None
+        self.close()
+
+    def close(self):
+        """Close the host socket and forget everything"""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.mode = None
+        self.listening = False
+        self.eof = False
+        self.remote = None
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.datagrams = []
+
+    def pump(self):
+        """Move whatever the host socket has received into the socket's buffer"""
+        if self.sock is None or self.eof:
+            return
+        if self.mode == esp32spi.ESP_SPIcontrol.UDP_MODE:
+            while True:
+                try:
+                    data, address = self.sock.recvfrom(65535)
+                except OSError:
+                    break
+                self.datagrams.append((data, address))
+            if not self.rx and self.datagrams:
+                data, self.remote = self.datagrams.pop(0)
+                self.rx.extend(data)
+            return
+        while len(self.rx) < _RX_WINDOW:
+            try:
+                data = self.sock.recv(_RX_WINDOW - len(self.rx))
+            except (BlockingIOError, ssl.SSLWantReadError):
+                return
+            except OSError:
+                self.eof = True
+                return
+            if not data:
+                self.eof = True
+                return
+            self.rx.extend(data)
+
+    @property
+    def in_use(self):
+        """Whether the socket number is taken"""
+        return self.sock is not None
+
+
+class ESP32Simulator:
+    """Simulates an ESP32 running NINA-fw on the other end of an SPI bus.
+
+    The ``spi``, ``cs``, ``ready``, ``reset`` and ``gpio0`` attributes are meant to be
+    passed to ``ESP_SPIcontrol``.
+
+    :param str firmware_version: Version string reported by the firmware.
+    :param bytes mac_address: MAC address reported by the firmware, as sent over SPI.
+    :param list access_points: List of dicts with ``ssid``, ``bssid``, ``rssi``,
+        ``channel`` and ``authmode`` entries, returned by scans. Only these SSIDs
+        can be connected to.
+    :param dict hosts: Hostname to dotted-quad mappings answered before falling back
+        to the host's resolver.
+    :param str ip_address: The address reported as ours, and used to bind servers.
+    :param float response_delay: Seconds the ready line stays busy after each command,
+        to mimic the firmware's processing time.
+    :param int max_frame_len: Longest command frame the firmware accepts, the size of
+        its SPI buffer; longer frames get an error response.
+    :param int num_sockets: Number of socket numbers the firmware hands out.
+    :param float boot_time: Seconds the ready line stays busy after a reset.
+    :param int max_baudrate: Fastest SPI clock the link survives. Above it, every byte
+        in either direction gets a bit flipped, like a marginal board would.
+
+    ``commands_handled`` and ``transfers`` count the command frames processed and the
+    individual SPI reads and writes seen, for benchmarks.
+    """
+
+    def __init__(
+        self,
+        *,
+        firmware_version="1.7.7",
+        mac_address=b"\x01\x02\x03\x04\x05\x06",
+        access_points=None,
+        hosts=None,
+        ip_address="127.0.0.1",
+        response_delay=0,
+        max_frame_len=esp32spi._MAX_FRAME_LEN,
+        num_sockets=10,
+        max_baudrate=None,
+        boot_time=0,
+    ):
+        self.firmware_version = firmware_version
+        self.mac_address = bytes(mac_address)
+        if access_points is None:
+            access_points = [
+                {
+                    "ssid": b"Simulated",
+                    "bssid": b"\x10\x20\x30\x40\x50\x60",
+                    "rssi": -40,
+                    "channel": 6,
+                    "authmode": 4,
+                }
+            ]
+        self.access_points = access_points
+        self.hosts = {"localhost": "127.0.0.1"}
+        if hosts:
+            self.hosts.update(hosts)
+        self.ip_address = ip_address
+        self.response_delay = response_delay
+        self.max_frame_len = max_frame_len
+        self.max_baudrate = max_baudrate
+        self.boot_time = boot_time
+        self.pins = {}
+        self.commands_handled = 0
+        self.transfers = 0
+
+        self.spi = SimulatedSPI(self)
+        self.cs = _ChipSelectPin(self)
+        self.ready = _ReadyPin(self)
+        self.reset = _ResetPin(self)
+        self.gpio0 = SimulatedPin()
+
+        self._sockets = [_SimSocket() for _ in range(num_sockets)]
+        self._selected = False
+        self._clocked = False  # whether the current transaction transferred anything
+        self._busy_until = 0
+        self._frame = bytearray()
+        self._reply = None  # the reply the next transaction clocks out, if any
+        self._reply_pos = 0
+        self._handlers = {
+            esp32spi._SET_NET_CMD: self._set_net,
+            esp32spi._SET_PASSPHRASE_CMD: self._set_net,
+            esp32spi._SET_IP_CONFIG: self._ack,
+            esp32spi._SET_DNS_CONFIG: self._ack,
+            esp32spi._SET_HOSTNAME: self._ack,
+            esp32spi._SET_AP_NET_CMD: self._set_ap,
+            esp32spi._SET_AP_PASSPHRASE_CMD: self._set_ap,
+            esp32spi._SET_DEBUG_CMD: self._ack,
+            esp32spi._SET_ENT_IDENT_CMD: self._ack,
+            esp32spi._SET_ENT_UNAME_CMD: self._ack,
+            esp32spi._SET_ENT_PASSWD_CMD: self._ack,
+            esp32spi._SET_ENT_ENABLE_CMD: self._ack,
+            esp32spi._SET_CLI_CERT: self._ack,
+            esp32spi._SET_PK: self._ack,
+            esp32spi._GET_CONN_STATUS_CMD: self._get_status,
+            esp32spi._GET_IPADDR_CMD: self._get_ipaddr,
+            esp32spi._GET_MACADDR_CMD: self._get_macaddr,
+            esp32spi._GET_CURR_SSID_CMD: self._get_curr_ssid,
+            esp32spi._GET_CURR_BSSID_CMD: self._get_curr_bssid,
+            esp32spi._GET_CURR_RSSI_CMD: self._get_curr_rssi,
+            esp32spi._GET_CURR_ENCT_CMD: self._get_curr_enct,
+            esp32spi._DISCONNECT_CMD: self._disconnect,
+            esp32spi._GET_FW_VERSION_CMD: self._get_fw_version,
+            esp32spi._GET_TIME: self._get_time,
+            esp32spi._PING_CMD: self._ping,
+            esp32spi._START_SCAN_NETWORKS: self._ack,
+            esp32spi._SCAN_NETWORKS: self._scan_networks,
+            esp32spi._GET_IDX_BSSID_CMD: self._get_idx_bssid,
+            esp32spi._GET_IDX_RSSI_CMD: self._get_idx_rssi,
+            esp32spi._GET_IDX_CHAN_CMD: self._get_idx_chan,
+            esp32spi._GET_IDX_ENCT_CMD: self._get_idx_enct,
+            esp32spi._REQ_HOST_BY_NAME_CMD: self._req_host_by_name,
+            esp32spi._GET_HOST_BY_NAME_CMD: self._get_host_by_name,
+            esp32spi._GET_SOCKET_CMD: self._get_socket,
+            esp32spi._START_CLIENT_TCP_CMD: self._start_client,
+            esp32spi._STOP_CLIENT_TCP_CMD: self._stop_client,
+            esp32spi._GET_CLIENT_STATE_TCP_CMD: self._get_client_state,
+            esp32spi._START_SERVER_TCP_CMD: self._start_server,
+            esp32spi._GET_STATE_TCP_CMD: self._get_server_state,
+            esp32spi._AVAIL_DATA_TCP_CMD: self._avail_data,
+            esp32spi._GET_DATABUF_TCP_CMD: self._get_databuf,
+            esp32spi._SEND_DATA_TCP_CMD: self._send_data,
+            esp32spi._DATA_SENT_TCP_CMD: self._data_sent,
+            esp32spi._INSERT_DATABUF_TCP_CMD: self._insert_databuf,
+            esp32spi._SEND_UDP_DATA_CMD: self._send_udp_data,
+            esp32spi._GET_REMOTE_DATA_CMD: self._get_remote_data,
+            esp32spi._SET_PIN_MODE_CMD: self._set_pin_mode,
+            esp32spi._SET_DIGITAL_WRITE_CMD: self._set_digital_write,
+            esp32spi._SET_ANALOG_WRITE_CMD: self._set_analog_write,
+            esp32spi._SET_DIGITAL_READ_CMD: self._set_digital_read,
+            esp32spi._SET_ANALOG_READ_CMD: self._set_analog_read,
+        }
+        self.reboot()
+
+    def reboot(self):
+        """Drop all connections and state, as if the ESP32 had been power cycled"""
+        for sock in self._sockets:
+            sock.close()
+        self.status = esp32spi.WL_IDLE_STATUS
+        self.ssid = None
+        self._resolved = None
+        self._frame = bytearray()
+        self._reply = None
+        self._reply_pos = 0
+        self._busy_until = time.monotonic() + self.boot_time
+
+    def close(self):
+        """Close every host socket held by the simulator"""
+        self.reboot()
+
+    # SPI bus and pin plumbing
+
+    def _busy(self):
+        if self._selected:
+            return True
+        return self._busy_until > time.monotonic()
+
+    def _select(self):
+        self._selected = True
+
+    def _deselect(self):
+        self._selected = False
+        if not self._clocked:  # nothing was transferred, so nothing happened
+            return
+        self._clocked = False
+        if self._reply is not None:
+            # the reply goes out in a single transaction, whatever was not read is lost
+            self._reply = None
+            self._reply_pos = 0
+            return
+        frame = self._frame
+        self._frame = bytearray()
+        self._reply = self._handle_frame(frame)
+        self._reply_pos = 0
+        self.commands_handled += 1
+        if self.response_delay:
+            self._busy_until = time.monotonic() + self.response_delay
+
+    def _garbled(self):
+        return self.max_baudrate is not None and self.spi.frequency > self.max_baudrate
+
+    def _receive(self, buf, start, end):
+        self.transfers += 1
+        if end > start:
+            self._clocked = True
+        if self._reply is not None:  # a reply transaction, what the host sends is dropped
+            return
+        if self._garbled():
+            self._frame.extend(b ^ 0x01 for b in memoryview(buf)[start:end])
+        else:
+            self._frame.extend(memoryview(buf)[start:end])
+
+    def _transmit(self, buf, start, end, write_value):
+        self.transfers += 1
+        if end > start:
+            self._clocked = True
+        reply = self._reply
+        if reply is None:
+            # a command transaction, the firmware sends nothing but takes in what the
+            # host clocks out while reading
+            if write_value is not None:
+                self._frame.extend(bytes((write_value,)) * (end - start))
+            reply = b""
+        pos = self._reply_pos
+        count = max(0, min(end - start, len(reply) - pos))
+        if count > 16:
+            buf[start : start + count] = reply[pos : pos + count]
+        else:  # byte by byte keeps short reads from allocating
+            for i in range(count):
+                buf[start + i] = reply[pos + i]
+        self._reply_pos += count
+        for i in range(start + count, end):
+            buf[i] = 0xFF
+        if self._garbled():
+            for i in range(start, end):
+                buf[i] ^= 0x01
+
+    # Command framing
+
+    def _parse_frame(self, frame):
+        """Split a command frame into its command byte and list of parameters"""
+        if len(frame) > self.max_frame_len or frame[0] != esp32spi._START_CMD:
+            return None
+        cmd = frame[1]
+        len_16 = cmd in _SEND_PARAM_LEN_16
+        params = []
+        ptr = 3
+        for _ in range(frame[2]):
+            param_len = frame[ptr]
+            ptr += 1
+            if len_16:
+                param_len = (param_len << 8) | frame[ptr]
+                ptr += 1
+            params.append(bytes(frame[ptr : ptr + param_len]))
+            ptr += param_len
+        if frame[ptr] != esp32spi._END_CMD:
+            return None
+        return cmd, params
+
+    def _handle_frame(self, frame):
+        """Parse one command frame and build the reply bytes"""
+        try:
+            parsed = self._parse_frame(frame)
+        except IndexError:
+            parsed = None
+        if parsed is None:
+            return _ERROR_REPLY
+        cmd, params = parsed
+
+        handler = self._handlers.get(cmd)
+        if handler is None:
+            return _ERROR_REPLY
+        try:
+            responses = handler(params)
+        except (IndexError, struct.error):
+            responses = None
+        if responses is None:
+            return _ERROR_REPLY
+
+        reply = bytearray((esp32spi._START_CMD, cmd | esp32spi._REPLY_FLAG, len(responses)))
+        for response in responses:
+            if cmd in _REPLY_PARAM_LEN_16:
+                reply.append((len(response) >> 8) & 0xFF)
+            reply.append(len(response) & 0xFF)
+            reply.extend(response)
+        reply.append(esp32spi._END_CMD)
+        return bytes(reply)
+
+    # Network commands
+
+    @staticmethod
+    def _ack(params):
+        return [b"\x01"]
+
+    def _find_ap(self, ssid):
+        for ap in self.access_points:
+            if ap["ssid"] == ssid:
+                return ap
+        return None
+
+    def _set_net(self, params):
+        if self._find_ap(params[0]) is None:
+            self.status = esp32spi.WL_NO_SSID_AVAIL
+        else:
+            self.status = esp32spi.WL_CONNECTED
+            self.ssid = params[0]
+        return [b"\x01"]
+
+    def _set_ap(self, params):
+        self.ssid = params[0]
+        self.status = esp32spi.WL_AP_LISTENING
+        return [b"\x01"]
+
+    def _disconnect(self, params):
+        self.status = esp32spi.WL_DISCONNECTED
+        self.ssid = None
+        return [b"\x01"]
+
+    def _get_status(self, params):
+        return [bytes((self.status,))]
+
+    def _get_ipaddr(self, params):
+        ip = socket.inet_aton(self.ip_address)
+        return [ip, b"\xff\x00\x00\x00", ip]
+
+    def _get_macaddr(self, params):
+        return [self.mac_address]
+
+    def _current_ap(self):
+        ap = self._find_ap(self.ssid)
+        if ap is None:
+            return {"ssid": b"", "bssid": bytes(6), "rssi": 0, "channel": 0, "authmode": 0}
+        return ap
+
+    def _get_curr_ssid(self, params):
+        return [self._current_ap()["ssid"]]
+
+    def _get_curr_bssid(self, params):
+        return [self._current_ap()["bssid"]]
+
+    def _get_curr_rssi(self, params):
+        return [struct.pack("<i", self._current_ap()["rssi"])]
+
+    def _get_curr_enct(self, params):
+        return [bytes((self._current_ap()["authmode"],))]
+
+    def _get_fw_version(self, params):
+        return [self.firmware_version.encode() + b"\x00"]
+
+    def _get_time(self, params):
+        if self.status != esp32spi.WL_CONNECTED:
+            return [bytes(4)]
+        return [struct.pack("<i", int(time.time()))]
+
+    @staticmethod
+    def _ping(params):
+        return [struct.pack("<H", 1)]
+
+    def _scan_networks(self, params):
+        return [ap["ssid"] for ap in self.access_points]
+
+    def _get_idx_bssid(self, params):
+        return [self.access_points[params[0][0]]["bssid"]]
+
+    def _get_idx_rssi(self, params):
+        return [struct.pack("<i", self.access_points[params[0][0]]["rssi"])]
+
+    def _get_idx_chan(self, params):
+        return [bytes((self.access_points[params[0][0]]["channel"],))]
+
+    def _get_idx_enct(self, params):
+        return [bytes((self.access_points[params[0][0]]["authmode"],))]
+
+    def _resolve(self, hostname):
+        hostname = hostname.decode("utf-8")
+        if hostname in self.hosts:
+            return socket.inet_aton(self.hosts[hostname])
+        return socket.inet_aton(socket.gethostbyname(hostname))
+
+    def _req_host_by_name(self, params):
+        try:
+            self._resolved = self._resolve(params[0])
+        except (OSError, UnicodeError):
+            self._resolved = None
+            return [b"\x00"]
+        return [b"\x01"]
+
+    def _get_host_by_name(self, params):
+        if self._resolved is None:
+            return [bytes(4)]
+        return [self._resolved]
+
+    # Socket commands
+
+    def _free_socket(self):
+        for num, sock in enumerate(self._sockets):
+            if not sock.in_use:
+                return num
+        return _NO_SOCKET
+
+    def _get_socket(self, params):
+        return [bytes((self._free_socket(),))]
+
+    def _start_client(self, params):
+        if len(params) == 5:
+            hostname, _, port, socknum, mode = params
+            try:
+                ip = socket.inet_ntoa(self._resolve(hostname))
+            except (OSError, UnicodeError):
+                return [b"\x00"]
+            server_hostname = hostname.decode("utf-8")
+        else:
+            ip, port, socknum, mode = params
+            ip = socket.inet_ntoa(ip)
+            server_hostname = None
+        sock = self._sockets[socknum[0]]
+        sock.close()
+        remote = (ip, struct.unpack(">H", port)[0])
+        try:
+            sock.sock = self._open_client(remote, mode[0], server_hostname)
+        except OSError:
+            return [b"\x00"]
+        sock.mode = mode[0]
+        sock.remote = remote
+        return [b"\x01"]
+
+    @staticmethod
+    def _open_client(remote, mode, server_hostname):
+        if mode == esp32spi.ESP_SPIcontrol.UDP_MODE:
+            host_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            host_sock = socket.create_connection(remote, timeout=3)
+            if mode == esp32spi.ESP_SPIcontrol.TLS_MODE:
+                context = ssl.create_default_context()
+                host_sock = context.wrap_socket(host_sock, server_hostname=server_hostname)
+        host_sock.setblocking(False)
+        return host_sock
+
+    def _start_server(self, params):
+        if len(params) == 4:
+            params = params[1:]
+        port, socknum, mode = params
+        sock = self._sockets[socknum[0]]
+        if sock.in_use and sock.mode == esp32spi.ESP_SPIcontrol.UDP_MODE:
+            # a UDP "client" also listens for the answers, on its own local port
+            return [b"\x01"]
+        sock.close()
+        try:
+            sock.sock = self._open_server(struct.unpack(">H", port)[0], mode[0])
+        except OSError:
+            return [b"\x00"]
+        sock.mode = mode[0]
+        sock.listening = mode[0] != esp32spi.ESP_SPIcontrol.UDP_MODE
+        return [b"\x01"]
+
+    def _open_server(self, port, mode):
+        if mode == esp32spi.ESP_SPIcontrol.UDP_MODE:
+            host_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            host_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            host_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        host_sock.bind((self.ip_address, port))
+        if mode != esp32spi.ESP_SPIcontrol.UDP_MODE:
+            host_sock.listen(5)
+        host_sock.setblocking(False)
+        return host_sock
+
+    def _stop_client(self, params):
+        self._sockets[params[0][0]].close()
+        return [b"\x01"]
+
+    def _accept(self, sock):
+        """Accept a pending connection on a listening socket into a free socket number"""
+        try:
+            host_sock, address = sock.sock.accept()
+        except (BlockingIOError, OSError):
+            return _NO_SOCKET
+        num = self._free_socket()
+        if num == _NO_SOCKET:
+            host_sock.close()
+            return _NO_SOCKET
+        host_sock.setblocking(False)
+        client = self._sockets[num]
+        client.sock = host_sock
+        client.mode = esp32spi.ESP_SPIcontrol.TCP_MODE
+        client.remote = address
+        return num
+
+    def _get_client_state(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.listening:
+            return [bytes((esp32spi.SOCKET_LISTEN,))]
+        sock.pump()
+        if sock.in_use and (not sock.eof or sock.rx):
+            return [bytes((esp32spi.SOCKET_ESTABLISHED,))]
+        return [bytes((esp32spi.SOCKET_CLOSED,))]
+
+    def _get_server_state(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.listening:
+            return [bytes((esp32spi.SOCKET_LISTEN,))]
+        return [bytes((esp32spi.SOCKET_CLOSED,))]
+
+    def _avail_data(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.listening:
+            return [struct.pack("<H", self._accept(sock))]
+        sock.pump()
+        return [struct.pack("<H", min(len(sock.rx), 0xFFFF))]
+
+    def _get_databuf(self, params):
+        sock = self._sockets[params[0][0]]
+        size = params[1][0] | (params[1][1] << 8)
+        sock.pump()
+        if not sock.rx:
+            # like the firmware, whose read of an empty client fails
+            return None
+        data = bytes(sock.rx[:size])
+        del sock.rx[:size]
+        return [data]
+
+    def _send_data(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.sock is None or sock.listening:
+            return [struct.pack("<H", 0)]
+        data = params[1]
+        try:
+            sock.sock.setblocking(True)
+            sock.sock.sendall(data)
+        except OSError:
+            return [struct.pack("<H", 0)]
+        finally:
+            sock.sock.setblocking(False)
+        return [struct.pack("<H", len(data))]
+
+    def _data_sent(self, params):
+        sock = self._sockets[params[0][0]]
+        return [b"\x01" if sock.in_use else b"\x00"]
+
+    def _insert_databuf(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.sock is None:
+            return [b"\x00"]
+        sock.tx.extend(params[1])
+        return [b"\x01"]
+
+    def _send_udp_data(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.sock is None or sock.remote is None:
+            return [b"\x00"]
+        try:
+            sock.sock.sendto(sock.tx, sock.remote)
+        except OSError:
+            return [b"\x00"]
+        finally:
+            sock.tx = bytearray()
+        return [b"\x01"]
+
+    def _get_remote_data(self, params):
+        sock = self._sockets[params[0][0]]
+        if sock.remote is None:
+            return [bytes(4), bytes(2)]
+        return [socket.inet_aton(sock.remote[0]), struct.pack("<H", sock.remote[1])]
+
+    # GPIO commands
+
+    def _pin(self, num):
+        return self.pins.setdefault(num, {"mode": 0, "value": 0, "analog": 0})
+
+    def _set_pin_mode(self, params):
+        self._pin(params[0][0])["mode"] = params[1][0]
+        return [b"\x01"]
+
+    def _set_digital_write(self, params):
+        self._pin(params[0][0])["value"] = params[1][0]
+        return [b"\x01"]
+
+    def _set_analog_write(self, params):
+        self._pin(params[0][0])["analog"] = params[1][0]
+        return [b"\x01"]
+
+    def _set_digital_read(self, params):
+        return [bytes((1 if self._pin(params[0][0])["value"] else 0,))]
+
+    def _set_analog_read(self, params):
+        # 12 bit reading, scaled from the last analog write
+        return [struct.pack("<i", self._pin(params[0][0])["analog"] << 4)]